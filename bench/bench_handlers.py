@@ -0,0 +1,221 @@
+"""Benchmark ponta a ponta dos handlers de main.py contra upstreams falsos locais.
+
+Sobe bench.fake_upstream, gera um config.ini temporário apontando para ele (via N2BOT_CONFIG)
+e chama os handlers reais com Update/Context sintéticos, medindo vazão e latências p50/p95/p99.
+
+Uso: python -m bench.bench_handlers [--requests 200] [--concurrency 20] [--scenario cto --scenario ont]
+     [--latency 0.05] [--cpe-latency 0.3] [--error-rate 0.01] [--box-size 32] [--telegram-latency 0.02]
+
+Cenários unidos por "+" (ex.: --scenario cto_full+ont) rodam intercalados, cada um por um usuário diferente,
+com as latências reportadas separadamente.
+"""
+import argparse
+import asyncio
+import functools
+import importlib
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from bench.fake_upstream import FakeUpstream, add_upstream_args, box_name
+
+USER_ID = 4242
+SCENARIOS = ["ajuda", "sobreaviso", "cliente", "ont", "cto", "cto_nome", "cto_full"]
+
+CONFIG_TEMPLATE = """\
+[token]
+TOKEN = 0:bench
+TOKEN_CTO = bench
+[mysql]
+host = 127.0.0.1
+port = 3306
+user = bench
+passwd = bench
+db = bench
+[urls]
+URL_CLISTATUS = {clistatus}
+URL_CPESTATUS = {cpestatus}
+URL_CHECK_CTO = {cto}
+URL_SOBREAVISO = {sobreaviso}
+"""
+
+
+class FakeMessage:
+    """Mensagem do Telegram que só registra as chamadas, com latência opcional da Bot API."""
+
+    def __init__(self, bench, text: str = ""):
+        self.bench = bench
+        self.text = text
+        self.chat = SimpleNamespace(send_message=self._send)
+
+    async def _api(self):
+        self.bench.api_calls += 1
+        if self.bench.telegram_latency:
+            await asyncio.sleep(self.bench.telegram_latency)
+
+    async def _send(self, text, **kwargs):
+        await self._api()
+        return FakeMessage(self.bench, text)
+
+    async def reply_text(self, text, **kwargs):
+        return await self._send(text, **kwargs)
+
+    async def edit_text(self, text, **kwargs):
+        await self._api()
+        self.text = text
+        return self
+
+    async def delete(self):
+        await self._api()
+        return True
+
+
+class HandlerBench:
+    def __init__(self, main_module, client_ids: list, box_ids: list, telegram_latency: float):
+        self.main = main_module
+        self.client_ids = client_ids
+        self.box_ids = box_ids
+        self.telegram_latency = telegram_latency
+        self.api_calls = 0
+        self.rng = random.Random(7)
+
+    def make_update(self, callback_data: str = None, user_id: int = USER_ID):
+        user = SimpleNamespace(id=user_id, first_name="Bench", is_bot=False)
+        message = FakeMessage(self)
+        query = None
+        if callback_data is not None:
+            async def answer(*args, **kwargs):
+                await message._api()
+            query = SimpleNamespace(data=callback_data, from_user=user, answer=answer, edit_message_text=message.edit_text)
+        return SimpleNamespace(effective_user=user, effective_message=message, message=message, callback_query=query)
+
+    def scenario(self, name: str, user_id: int = USER_ID):
+        """Devolve (handler, update, context) para uma chamada do cenário."""
+        m = self.main
+        make_update = functools.partial(self.make_update, user_id=user_id)
+        client_id = str(self.rng.choice(self.client_ids))
+        box_id = self.rng.choice(self.box_ids)
+        if name == "cliente":
+            return m.client, make_update(), SimpleNamespace(args=[client_id])
+        if name == "ont":
+            return m.cpestatus, make_update(), SimpleNamespace(args=[client_id])
+        if name == "cto":
+            return m.cto_data, make_update(), SimpleNamespace(args=[client_id])
+        if name == "cto_nome":
+            return m.cto_data, make_update(), SimpleNamespace(args=[box_name(box_id)])
+        if name == "cto_full":
+            return m.cto_full, make_update(f"cto_full_{box_id}"), SimpleNamespace(args=[])
+        if name == "sobreaviso":
+            return m.sobreaviso, make_update(), SimpleNamespace(args=[])
+        if name == "ajuda":
+            return m.help, make_update(), SimpleNamespace(args=[])
+        raise ValueError(f"Cenário desconhecido: {name}")
+
+    async def run(self, name: str, requests: int, concurrency: int) -> dict:
+        semaphore = asyncio.Semaphore(concurrency)
+        parts = name.split("+")
+        latencies, errors = {part: [] for part in parts}, 0
+
+        async def one(index: int):
+            nonlocal errors
+            part = parts[index % len(parts)]
+            handler, update, context = self.scenario(part, USER_ID + index % len(parts))
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await self.main.with_deadline(handler)(update, context)
+                except Exception as e:
+                    errors += 1
+                    logging.debug(f"{name}: {e}")
+                latencies[part].append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(requests)))
+        elapsed = time.perf_counter() - started
+        return {"scenario": name, "requests": requests, "errors": errors, "elapsed": elapsed, "latencies": latencies}
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def load_main(urls: dict, extra_config: str = ""):
+    """Importa main.py com a configuração apontando para os upstreams falsos (`urls` de FakeUpstream)."""
+    config = tempfile.NamedTemporaryFile("w", suffix=".ini", delete=False)
+    config.write(CONFIG_TEMPLATE.format(**urls) + extra_config)
+    config.close()
+    os.environ['N2BOT_CONFIG'] = config.name
+    for env in ('N2BOT_CLISTATUS_URL', 'N2BOT_CPESTATUS_URL', 'N2BOT_CTO_URL', 'N2BOT_SOBREAVISO_URL'):
+        os.environ.pop(env, None)
+    try:
+        return importlib.import_module("main")
+    finally:
+        os.unlink(config.name)
+
+
+def seed_authorized_users(main_module):
+    # Sem MySQL no benchmark: o snapshot de usuários autorizados é preenchido diretamente
+    users = main_module.auth.authorized_users
+    users._ids = frozenset(str(USER_ID + offset) for offset in range(len(SCENARIOS)))
+    users.loaded_at = time.time() + 10 ** 6
+
+
+async def bench(args):
+    upstream = FakeUpstream(args.latency, args.cpe_latency, args.jitter, args.error_rate, args.box_size)
+    url = await upstream.start()
+    main_module = load_main(upstream.urls)
+    logging.getLogger().setLevel(logging.WARNING if args.verbose else logging.CRITICAL)
+    seed_authorized_users(main_module)
+
+    boxes = max(1, args.boxes)
+    client_ids = [box * args.box_size + i for box in range(1, boxes + 1) for i in range(args.box_size)]
+    runner = HandlerBench(main_module, client_ids, list(range(1, boxes + 1)), args.telegram_latency)
+
+    print(f"upstreams: {url} | latência {args.latency * 1000:.0f} ms, ACS {upstream.cpe_latency * 1000:.0f} ms, "
+          f"erro {args.error_rate:.1%}, {args.box_size} portas, {boxes} CTOs")
+    print(f"{'cenário':<11} {'req':>5} {'erros':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'HTTP/req':>9}")
+    try:
+        for name in args.scenario or SCENARIOS:
+            if args.cold:
+                main_module.cache.box_cache.clear()
+            before = sum(upstream.hits.values())
+            result = await runner.run(name, args.requests, args.concurrency)
+            calls = sum(upstream.hits.values()) - before
+            for part, values in result["latencies"].items():
+                lat = [value * 1000 for value in values]
+                label = part if part == name else f"{part} ({name})"
+                print(f"{label:<11} {len(lat):>5} {result['errors']:>5} "
+                      f"{result['requests'] / result['elapsed']:>8.1f} {percentile(lat, 50):>8.1f} "
+                      f"{percentile(lat, 95):>8.1f} {percentile(lat, 99):>8.1f} {calls / result['requests']:>9.2f}")
+    finally:
+        await main_module.reqs.session_pool.close()
+        await upstream.stop()
+    print(f"chamadas à Bot API simuladas: {runner.api_calls}; requisições por endpoint: {dict(upstream.hits)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200, help="chamadas por cenário")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--scenario", action="append", help=f"um de {', '.join(SCENARIOS)}, ou vários unidos por '+'")
+    parser.add_argument("--boxes", type=int, default=20, help="CTOs distintas sorteadas nos cenários")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="latência simulada da Bot API, em segundos")
+    parser.add_argument("--cold", action="store_true", help="limpa o cache de /getbox antes de cada cenário")
+    parser.add_argument("--verbose", action="store_true")
+    add_upstream_args(parser)
+    args = parser.parse_args()
+    for name in args.scenario or []:
+        if not set(name.split("+")) <= set(SCENARIOS):
+            parser.error(f"cenário inválido: {name}")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Microbenchmark da renderização de CTOs: custo por mensagem para caixas de 8/16/32/64 portas.
+
+Uso: python -m bench.bench_render [--repeat N]  (ou python bench/bench_render.py)
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from types import SimpleNamespace
+
+# Rodado como script, o diretório do bench (e não a raiz do repositório) é que entra no sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.messages as msgs  # noqa: E402
+
+STATUSES = ["em operação", "em operação", "em operação", "reservado", "disponível", "bloqueado"]
+
+
+def make_box(ports: int, seed: int = 42) -> tuple[dict, dict]:
+    rng = random.Random(seed)
+    points, cpe_status = [], {}
+    for i in range(ports):
+        cliente = str(100000 + i)
+        points.append({
+            "point_name": f"{i + 1:02d}",
+            "status_name": rng.choice(STATUSES),
+            "verified_signal": f"-{rng.randint(15, 27)}.{rng.randint(0, 99):02d}",
+            "attributes": {"cod_cli_active": cliente, "cod_srv_hsi": str(500000 + i), "cod_opportunity": str(900000 + i)},
+        })
+        cpe_status[cliente] = {"Sinal": f"-{rng.randint(15, 27)}.00 dBm ✅", "state": rng.choice([0, 4])}
+    return {"box_full_name": f"SPO-A001-CTO{ports}", "points": points}, cpe_status
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    bot_message = msgs.BotMessage(SimpleNamespace(first_name="Bench"))
+    print(f"{'portas':>6} {'chars':>7} {'partes':>6} {'render µs':>10} {'render+split µs':>16}")
+    for ports in (8, 16, 32, 64):
+        result, cpe_status = make_box(ports)
+        text = bot_message.build_message_cto(result, cpe_status)
+        parts = bot_message.build_message_cto_parts(result, cpe_status)
+        render = timeit.timeit(lambda: bot_message.build_message_cto(result, cpe_status), number=args.repeat)
+        split = timeit.timeit(lambda: bot_message.build_message_cto_parts(result, cpe_status), number=args.repeat)
+        print(f"{ports:>6} {len(text):>7} {len(parts):>6} {render / args.repeat * 1e6:>10.1f} {split / args.repeat * 1e6:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
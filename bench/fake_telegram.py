@@ -0,0 +1,168 @@
+"""Cliente Telegram falso para testar o modo webhook localmente.
+
+Sobe uma Bot API falsa (getMe, sendMessage, editMessageText, ...) e os upstreams de bench.fake_upstream,
+inicia o bot em modo webhook apontando para ambos e posta updates sintéticos com o token secreto,
+medindo o tempo até a primeira resposta do bot em cada chat. Também confere a recusa de token inválido.
+
+Uso: python -m bench.fake_telegram [--updates 100] [--command /sobreaviso]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import socket
+import time
+from collections import Counter
+
+import aiohttp
+from aiohttp import web
+
+from bench.bench_handlers import USER_ID, load_main, percentile, seed_authorized_users
+from bench.fake_upstream import FakeUpstream, add_upstream_args
+
+SECRET = "bench-secret"
+REPLY_METHODS = {"sendMessage", "editMessageText"}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeBotApi:
+    """Bot API mínima: responde às chamadas do bot e registra quando cada chat recebeu resposta."""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.first_reply = {}
+        self._message_id = 0
+        self._runner = None
+        self.url = None
+
+    def _message(self, chat_id, text) -> dict:
+        self._message_id += 1
+        return {"message_id": self._message_id, "date": int(time.time()), "text": text,
+                "chat": {"id": int(chat_id), "type": "private"}}
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "N2 Bench", "username": "n2_bench_bot"}
+        elif method in REPLY_METHODS:
+            chat_id = params.get("chat_id", 0)
+            self.first_reply.setdefault(int(chat_id), time.perf_counter())
+            result = self._message(chat_id, params.get("text", ""))
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        port = free_port()
+        await web.TCPSite(self._runner, "127.0.0.1", port).start()
+        self.url = f"http://127.0.0.1:{port}/bot"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+def make_update(update_id: int, chat_id: int, command: str) -> dict:
+    name = command.split()[0]
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": USER_ID, "is_bot": False, "first_name": "Bench"},
+            "text": command,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(name)}],
+        },
+    }
+
+
+async def run(args):
+    upstream = FakeUpstream(args.latency, args.cpe_latency, args.jitter, args.error_rate, args.box_size)
+    bot_api = FakeBotApi()
+    await upstream.start()
+    api_url = await bot_api.start()
+    port = free_port()
+    main_module = load_main(upstream.urls, (
+        f"[bot]\nmode = webhook\napi_base_url = {api_url}\n"
+        f"[webhook]\nlisten = 127.0.0.1\nport = {port}\npath = /telegram\nsecret = {SECRET}\n"
+    ))
+    logging.getLogger().setLevel(logging.WARNING if args.verbose else logging.CRITICAL)
+
+    stop = asyncio.Event()
+    app = main_module.build_application(main_module.get_bot_token())
+    bot_task = asyncio.create_task(main_module.webhook.run_webhook(app, stop))
+    webhook_url = f"http://127.0.0.1:{port}/telegram"
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            for _ in range(100):
+                try:
+                    async with session.post(webhook_url, json={}, headers={"X-Telegram-Bot-Api-Secret-Token": "errado"}) as resp:
+                        rejected_status = resp.status
+                    break
+                except aiohttp.ClientConnectorError:
+                    await asyncio.sleep(0.05)
+            seed_authorized_users(main_module)
+
+            # Um chat por update, para medir a primeira resposta de cada um
+            sent_at, acks = {}, []
+            started = time.perf_counter()
+            for update_id in range(1, args.updates + 1):
+                chat_id = USER_ID * 1000 + update_id
+                body = json.dumps(make_update(update_id, chat_id, args.command))
+                t0 = time.perf_counter()
+                async with session.post(webhook_url, data=body, headers={
+                    "X-Telegram-Bot-Api-Secret-Token": SECRET, "Content-Type": "application/json"
+                }) as resp:
+                    acks.append((time.perf_counter() - t0) * 1000)
+                    resp.raise_for_status()
+                sent_at[chat_id] = t0
+
+            deadline = time.perf_counter() + args.timeout
+            while len(bot_api.first_reply.keys() & sent_at.keys()) < len(sent_at) and time.perf_counter() < deadline:
+                await asyncio.sleep(0.01)
+            elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        await bot_task
+        await bot_api.stop()
+        await upstream.stop()
+
+    replies = [(bot_api.first_reply[c] - t) * 1000 for c, t in sent_at.items() if c in bot_api.first_reply]
+    print(f"token inválido -> HTTP {rejected_status}")
+    print(f"{len(sent_at)} updates, {len(replies)} respondidos em {elapsed:.2f}s ({len(replies) / elapsed:.1f} updates/s)")
+    print(f"ack do webhook (ms): p50 {percentile(acks, 50):.1f} p95 {percentile(acks, 95):.1f} p99 {percentile(acks, 99):.1f}")
+    if replies:
+        print(f"primeira resposta (ms): p50 {percentile(replies, 50):.1f} p95 {percentile(replies, 95):.1f} "
+              f"p99 {percentile(replies, 99):.1f}")
+    print(f"chamadas à Bot API: {dict(bot_api.calls)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=100)
+    parser.add_argument("--command", default="/sobreaviso")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--verbose", action="store_true")
+    add_upstream_args(parser)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
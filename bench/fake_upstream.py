@@ -0,0 +1,201 @@
+"""Servidor HTTP local que imita as APIs de CTO, ACS (cpestatus), status de clientes e sobreaviso.
+
+Todos os endpoints ficam no mesmo servidor; os dados são determinísticos a partir do código do cliente:
+o cliente `c` pertence à box `c // box_size`, com serviço HSI `c + 500000`.
+
+Uso isolado: python -m bench.fake_upstream --port 8081 --latency 0.05 --cpe-latency 0.3
+"""
+import argparse
+import asyncio
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+from aiohttp import web
+
+STATUSES = ["em operação", "em operação", "em operação", "reservado", "disponível", "bloqueado"]
+SERVICE_OFFSET = 500000
+UPSTREAM_HOSTS = {"clistatus": "127.0.0.1", "cpestatus": "127.0.0.2", "cto": "127.0.0.3", "sobreaviso": "127.0.0.4"}
+
+
+def box_name(box_id: int) -> str:
+    return f"BEN-A{box_id % 1000:03d}-CTO1"
+
+
+class FakeUpstream:
+    """Aplicação aiohttp com latência, jitter e taxa de erro (HTTP 503) configuráveis."""
+
+    def __init__(self, latency: float = 0.05, cpe_latency: float = None, jitter: float = 0.5,
+                 error_rate: float = 0.0, box_size: int = 16, seed: int = 42):
+        self.latency = latency
+        self.cpe_latency = latency if cpe_latency is None else cpe_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.box_size = box_size
+        self.rng = random.Random(seed)
+        self.hits = Counter()
+        self._runner = None
+        self.url = None
+        self.urls = {}
+
+    def _box_of(self, client_id: int) -> int:
+        return client_id // self.box_size
+
+    def _point(self, box_id: int, index: int) -> dict:
+        client_id = box_id * self.box_size + index
+        status = STATUSES[(client_id * 7) % len(STATUSES)]
+        return {
+            "point_id": client_id,
+            "point_name": f"{index + 1:02d}",
+            "status_id": 8 if status == "em operação" else 4,
+            "status_name": status,
+            "verified_signal": f"-{18 + client_id % 8}.{client_id % 100:02d}",
+            "pon_port": "1/1/1",
+            "box_id": box_id,
+            "attributes": {
+                "cod_cli_active": str(client_id) if status == "em operação" else "",
+                "cod_srv_hsi": str(client_id + SERVICE_OFFSET),
+                "cod_opportunity": str(client_id),
+            },
+        }
+
+    async def _delay(self, base: float):
+        if base > 0:
+            await asyncio.sleep(base * (1 + self.rng.uniform(-self.jitter, self.jitter)))
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.hits[request.match_info.route.resource.canonical] += 1
+        await self._delay(self.cpe_latency if request.path.startswith("/acs/") else self.latency)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return web.Response(status=503, text="indisponível")
+        return await handler(request)
+
+    async def getbox(self, request: web.Request) -> web.Response:
+        box_id = int(request.query["box_id"])
+        points = [self._point(box_id, i) for i in range(self.box_size)]
+        return web.json_response({"result": {"box_id": box_id, "box_full_name": box_name(box_id), "points": points}})
+
+    async def getpoint(self, request: web.Request) -> web.Response:
+        point_id = int(request.query["point_id"])
+        box_id = self._box_of(point_id)
+        return web.json_response({"result": {"point": self._point(box_id, point_id % self.box_size)}})
+
+    async def searchclient(self, request: web.Request) -> web.Response:
+        client_id = int(request.query["cod_cli"])
+        box_id = self._box_of(client_id)
+        point = self._point(box_id, client_id % self.box_size)
+        point["status_id"] = 8
+        return web.json_response({"results": [{"box_id": box_id, "box_full_name": box_name(box_id), "point": point}]})
+
+    async def searchbox(self, request: web.Request) -> web.Response:
+        # Busca por prefixo do nome, como no modo inline; um nome completo encontra só a própria CTO
+        query = request.query["box_name"].upper()
+        matches = [box_id for box_id in range(1, 1000) if box_name(box_id).startswith(query)][:50]
+        return web.json_response({"results": [{"box_id": box_id, "box_full_name": box_name(box_id)} for box_id in matches]})
+
+    async def searchreservations(self, request: web.Request) -> web.Response:
+        return web.json_response({"results": []})
+
+    async def cpestatus(self, request: web.Request) -> web.Response:
+        client_id = int(request.match_info["client_id"])
+        detail = {
+            "cid": str(client_id + SERVICE_OFFSET),
+            "cid2": str(client_id),
+            "cpeid": f"48575443{client_id:08X}",
+            "Modelo": "EG8145V5",
+            "Sinal": f"-{19 + client_id % 7}.{client_id % 100:02d}",
+            "state": 0 if client_id % 5 else 4,
+            "Uptime": 86400 + client_id,
+            "Temp": 45,
+        }
+        return web.json_response({"Result": {"code": 200, "details": [detail]}})
+
+    async def clistatus(self, request: web.Request) -> web.Response:
+        client_id = int(request.match_info["client_id"])
+        plan = {
+            "login_pppoe": f"cli{client_id}",
+            "status_pppoe": "Connected",
+            "numero_plano": client_id + SERVICE_OFFSET,
+            "nome_plano": "FIBRA 500M",
+            "status_plano": "Ativo",
+            "last_ip": f"10.0.{client_id % 256}.{client_id // 256 % 256}",
+            "ponto_acesso": box_name(self._box_of(client_id)),
+        }
+        return web.json_response({"result": [plan]})
+
+    async def sobreaviso(self, request: web.Request) -> web.Response:
+        today = datetime.now()
+        return web.json_response([{
+            "nome": "Plantonista Bench",
+            "periodo_inicio": (today - timedelta(days=1)).strftime("%d/%m/%Y"),
+            "periodo_fim": (today + timedelta(days=6)).strftime("%d/%m/%Y"),
+            "tel_plantao": "0000-0000",
+            "tel": ["1111-1111", "2222"],
+        }])
+
+    def build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/getbox", self.getbox)
+        app.router.add_get("/getpoint", self.getpoint)
+        app.router.add_get("/searchclient", self.searchclient)
+        app.router.add_get("/searchbox", self.searchbox)
+        app.router.add_get("/searchreservations", self.searchreservations)
+        app.router.add_get("/acs/cpestatus/{client_id}", self.cpestatus)
+        app.router.add_get("/isp/getclistatus/{client_id}", self.clistatus)
+        app.router.add_get("/api/sobreaviso", self.sobreaviso)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        self.urls = dict.fromkeys(UPSTREAM_HOSTS, self.url)
+        if host == "127.0.0.1":
+            # Um endereço de loopback por API, como em produção: disjuntores, limites e pools por host ficam separados
+            for name, upstream_host in UPSTREAM_HOSTS.items():
+                if upstream_host != host:
+                    await web.TCPSite(self._runner, upstream_host, port).start()
+                self.urls[name] = f"http://{upstream_host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def serve(args):
+    upstream = FakeUpstream(args.latency, args.cpe_latency, args.jitter, args.error_rate, args.box_size)
+    url = await upstream.start(args.host, args.port)
+    print(f"Upstreams falsos em {url} (Ctrl+C para encerrar)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await upstream.stop()
+
+
+def add_upstream_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.05, help="latência base das APIs, em segundos")
+    parser.add_argument("--cpe-latency", type=float, default=None, help="latência do /acs/cpestatus (padrão: --latency)")
+    parser.add_argument("--jitter", type=float, default=0.5, help="variação relativa da latência (0.5 = ±50%%)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas HTTP 503")
+    parser.add_argument("--box-size", type=int, default=16, help="portas por CTO")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_upstream_args(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
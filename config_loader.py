@@ -11,7 +11,8 @@ class LoaderInit:
             return
         try:
             absolute_path = os.path.dirname(__file__)
-            config_path = os.path.join(absolute_path, "config.ini")
+            # N2BOT_CONFIG permite apontar outro arquivo (ex.: benchmarks contra upstreams locais)
+            config_path = os.environ.get('N2BOT_CONFIG') or os.path.join(absolute_path, "config.ini")
             if not os.path.exists(config_path):
                 raise FileNotFoundError('Arquivo de configuração de ambiente não foi encontrado')
             config = ConfigParser()
@@ -27,8 +28,88 @@ class LoaderInit:
             os.environ['N2BOT_CPESTATUS_URL'] = config['urls']['URL_CPESTATUS']
             os.environ['N2BOT_CTO_URL'] = config['urls']['URL_CHECK_CTO']
             os.environ['N2BOT_SOBREAVISO_URL'] = config['urls']['URL_SOBREAVISO']
+            self._optional(config, 'mysql', 'pool_size', 'N2BOT_MYSQL_POOL_SIZE', '5')
+            self._optional(config, 'mysql', 'query_timeout', 'N2BOT_MYSQL_QUERY_TIMEOUT', '5')
+            self._optional(config, 'mysql', 'connect_timeout', 'N2BOT_MYSQL_CONNECT_TIMEOUT', '5')
+            self._optional(config, 'mysql', 'ping_idle', 'N2BOT_MYSQL_PING_IDLE', '60')
+            self._optional(config, 'auth', 'refresh_interval', 'N2BOT_AUTH_REFRESH_INTERVAL', '60')
+            self._optional(config, 'auth', 'max_staleness', 'N2BOT_AUTH_MAX_STALENESS', '300')
+            self._optional(config, 'cache', 'box_cache_size', 'N2BOT_BOX_CACHE_SIZE', '256')
+            self._optional(config, 'cache', 'box_cache_ttl', 'N2BOT_BOX_CACHE_TTL', '120')
+            self._optional(config, 'sobreaviso', 'refresh_interval', 'N2BOT_SOBREAVISO_REFRESH_INTERVAL', '900')
+            self._optional(config, 'topology', 'db_path', 'N2BOT_TOPOLOGY_DB', '')
+            self._optional(config, 'topology', 'fresh_age', 'N2BOT_TOPOLOGY_FRESH_AGE', '900')
+            self._optional(config, 'topology', 'max_stale_age', 'N2BOT_TOPOLOGY_MAX_STALE_AGE', '86400')
+            self._optional(config, 'topology', 'sync_interval', 'N2BOT_TOPOLOGY_SYNC_INTERVAL', '300')
+            self._optional(config, 'topology', 'sync_batch', 'N2BOT_TOPOLOGY_SYNC_BATCH', '20')
+            self._optional(config, 'cto', 'streaming', 'N2BOT_CTO_STREAMING', '1')
+            self._optional(config, 'cto', 'stream_edit_interval', 'N2BOT_STREAM_EDIT_INTERVAL', '2')
+            self._optional(config, 'resilience', 'command_deadline', 'N2BOT_COMMAND_DEADLINE', '30')
+            self._optional(config, 'resilience', 'retry_max_delay', 'N2BOT_RETRY_MAX_DELAY', '8')
+            self._optional(config, 'resilience', 'retry_budget_ratio', 'N2BOT_RETRY_BUDGET_RATIO', '0.2')
+            self._optional(config, 'resilience', 'retry_budget_max', 'N2BOT_RETRY_BUDGET_MAX', '10')
+            self._optional(config, 'resilience', 'cpe_hedge_after', 'N2BOT_CPE_HEDGE_AFTER', '3')
+            self._optional(config, 'breaker', 'failure_threshold', 'N2BOT_BREAKER_FAILURE_THRESHOLD', '5')
+            self._optional(config, 'breaker', 'failure_rate', 'N2BOT_BREAKER_FAILURE_RATE', '0.5')
+            self._optional(config, 'breaker', 'window', 'N2BOT_BREAKER_WINDOW', '20')
+            self._optional(config, 'breaker', 'slow_call_seconds', 'N2BOT_BREAKER_SLOW_CALL', '10')
+            self._optional(config, 'breaker', 'open_seconds', 'N2BOT_BREAKER_OPEN_SECONDS', '30')
+            self._optional(config, 'bot', 'concurrent_updates', 'N2BOT_CONCURRENT_UPDATES', '16')
+            self._optional(config, 'bot', 'mode', 'N2BOT_BOT_MODE', 'polling')
+            self._optional(config, 'bot', 'api_base_url', 'N2BOT_API_BASE_URL', '')
+            self._optional(config, 'webhook', 'listen', 'N2BOT_WEBHOOK_LISTEN', '0.0.0.0')
+            self._optional(config, 'webhook', 'port', 'N2BOT_WEBHOOK_PORT', '8443')
+            self._optional(config, 'webhook', 'path', 'N2BOT_WEBHOOK_PATH', '/telegram')
+            self._optional(config, 'webhook', 'url', 'N2BOT_WEBHOOK_URL', '')
+            self._optional(config, 'webhook', 'secret', 'N2BOT_WEBHOOK_SECRET', '')
+            self._optional(config, 'watchdog', 'interval', 'N2BOT_LOOP_WATCHDOG_INTERVAL', '0.1')
+            self._optional(config, 'watchdog', 'block_threshold', 'N2BOT_LOOP_BLOCK_THRESHOLD', '0.5')
+            self._optional(config, 'cache', 'box_name_ttl', 'N2BOT_BOX_NAME_CACHE_TTL', '3600')
+            self._optional(config, 'snapshot', 'path', 'N2BOT_SNAPSHOT_PATH', '')
+            self._optional(config, 'snapshot', 'interval', 'N2BOT_SNAPSHOT_INTERVAL', '300')
+            self._optional(config, 'snapshot', 'max_age', 'N2BOT_SNAPSHOT_MAX_AGE', '86400')
+            self._optional(config, 'audit', 'sink', 'N2BOT_AUDIT_SINK', '')
+            self._optional(config, 'audit', 'file', 'N2BOT_AUDIT_FILE', 'audit.log')
+            self._optional(config, 'audit', 'max_bytes', 'N2BOT_AUDIT_MAX_BYTES', '10485760')
+            self._optional(config, 'audit', 'backups', 'N2BOT_AUDIT_BACKUPS', '5')
+            self._optional(config, 'audit', 'table', 'N2BOT_AUDIT_TABLE', 'n2bot_audit')
+            self._optional(config, 'audit', 'queue_size', 'N2BOT_AUDIT_QUEUE_SIZE', '1000')
+            self._optional(config, 'audit', 'batch_size', 'N2BOT_AUDIT_BATCH_SIZE', '100')
+            self._optional(config, 'audit', 'flush_interval', 'N2BOT_AUDIT_FLUSH_INTERVAL', '2')
+            self._optional(config, 'scheduler', 'max_concurrency', 'N2BOT_SCHED_MAX_CONCURRENCY', '64')
+            self._optional(config, 'scheduler', 'upstream_limits', 'N2BOT_SCHED_UPSTREAM_LIMITS', 'cpestatus:16')
+            self._optional(config, 'adaptive', 'acs_enabled', 'N2BOT_ACS_ADAPTIVE', '0')
+            self._optional(config, 'adaptive', 'acs_initial', 'N2BOT_ACS_LIMIT_INITIAL', '8')
+            self._optional(config, 'adaptive', 'acs_min', 'N2BOT_ACS_LIMIT_MIN', '2')
+            self._optional(config, 'adaptive', 'acs_max', 'N2BOT_ACS_LIMIT_MAX', '64')
+            self._optional(config, 'adaptive', 'acs_latency_tolerance', 'N2BOT_ACS_LIMIT_TOLERANCE', '2.0')
+            self._optional(config, 'adaptive', 'acs_backoff', 'N2BOT_ACS_LIMIT_BACKOFF', '0.7')
+            self._optional(config, 'prefetch', 'enabled', 'N2BOT_CTO_PREFETCH', '1')
+            self._optional(config, 'prefetch', 'max_entries', 'N2BOT_CTO_PREFETCH_MAX', '32')
+            self._optional(config, 'prefetch', 'ttl', 'N2BOT_CTO_PREFETCH_TTL', '60')
+            self._optional(config, 'telegram', 'rate_limit', 'N2BOT_TELEGRAM_RATE_LIMIT', '1')
+            self._optional(config, 'telegram', 'overall_rate', 'N2BOT_TELEGRAM_OVERALL_RATE', '30')
+            self._optional(config, 'telegram', 'chat_rate', 'N2BOT_TELEGRAM_CHAT_RATE', '1')
+            self._optional(config, 'telegram', 'group_rate', 'N2BOT_TELEGRAM_GROUP_RATE', '0.33')
+            self._optional(config, 'telegram', 'chat_burst', 'N2BOT_TELEGRAM_CHAT_BURST', '3')
+            self._optional(config, 'telegram', 'max_retries', 'N2BOT_TELEGRAM_MAX_RETRIES', '2')
+            self._optional(config, 'telegram', 'progress_delay', 'N2BOT_PROGRESS_DELAY', '0.8')
+            self._optional(config, 'inline', 'debounce', 'N2BOT_INLINE_DEBOUNCE', '0.3')
+            self._optional(config, 'inline', 'min_chars', 'N2BOT_INLINE_MIN_CHARS', '3')
+            self._optional(config, 'inline', 'max_concurrency', 'N2BOT_INLINE_MAX_CONCURRENCY', '4')
+            self._optional(config, 'inline', 'page_size', 'N2BOT_INLINE_PAGE_SIZE', '50')
+            self._optional(config, 'inline', 'cache_time', 'N2BOT_INLINE_CACHE_TIME', '30')
+            self._optional(config, 'metrics', 'port', 'N2BOT_METRICS_PORT', '9464')
+            self._optional(config, 'metrics', 'host', 'N2BOT_METRICS_HOST', '127.0.0.1')
+            self._optional(config, 'http', 'pool_limit', 'N2BOT_HTTP_POOL_LIMIT', '100')
+            self._optional(config, 'http', 'pool_limit_per_host', 'N2BOT_HTTP_POOL_LIMIT_PER_HOST', '20')
+            self._optional(config, 'http', 'keepalive_timeout', 'N2BOT_HTTP_KEEPALIVE_TIMEOUT', '30')
+            self._optional(config, 'http', 'dns_cache_ttl', 'N2BOT_HTTP_DNS_CACHE_TTL', '300')
             self._config_loaded = True
         except KeyError as e:
             raise KeyError(f"Chave {e} não encontrada no arquivo de configuração")
         except FileNotFoundError as e:
             raise FileNotFoundError(e)
+
+    def _optional(self, config: ConfigParser, section: str, key: str, env: str, default: str):
+        os.environ[env] = config.get(section, key, fallback=default)
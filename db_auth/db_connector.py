@@ -1,19 +1,142 @@
+import asyncio
+import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import mysql.connector
+from mysql.connector import pooling
 
 
-def get_db():
-    try:
-        db = mysql.connector.connect(
+class DbPool:
+    """Pool limitado de conexões MySQL com as consultas executadas fora do event loop."""
+
+    def __init__(self):
+        self._pool = None
+        self._executor = None
+        self._lock = asyncio.Lock()
+        # connection_id -> instante do último uso bem-sucedido
+        self._last_used = {}
+
+    @property
+    def pool_size(self) -> int:
+        return int(os.environ.get('N2BOT_MYSQL_POOL_SIZE', 5))
+
+    @property
+    def query_timeout(self) -> float:
+        return float(os.environ.get('N2BOT_MYSQL_QUERY_TIMEOUT', 5))
+
+    @property
+    def ping_idle(self) -> float:
+        return float(os.environ.get('N2BOT_MYSQL_PING_IDLE', 60))
+
+    def _create_pool(self) -> pooling.MySQLConnectionPool:
+        return pooling.MySQLConnectionPool(
+            pool_name="n2bot",
+            pool_size=self.pool_size,
+            pool_reset_session=True,
             host=os.environ.get('N2BOT_MYSQL_HOST'),
             port=os.environ.get('N2BOT_MYSQL_PORT'),
             user=os.environ.get('N2BOT_MYSQL_USER'),
             password=os.environ.get('N2BOT_MYSQL_PASSWD'),
             database=os.environ.get('N2BOT_MYSQL_DB'),
+            connection_timeout=int(os.environ.get('N2BOT_MYSQL_CONNECT_TIMEOUT', 5)),
+            # O próprio servidor aborta o SELECT no prazo, liberando a conexão e o worker; reexecutado a cada
+            # reset de sessão do pool
+            init_command=f"SET SESSION max_execution_time = {int(self.query_timeout * 1000)}",
         )
-        cursor = db.cursor(dictionary=True)
-        return db, cursor
-    except Exception as e:
-        print(f"Erro ao conectar ao banco de dados MySQL: {e}")
-        raise
+
+    async def open(self):
+        async with self._lock:
+            if self._pool is not None:
+                return
+            # Um worker por conexão: nenhuma thread fica sem conexão disponível no pool
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="n2bot-db")
+            loop = asyncio.get_running_loop()
+            try:
+                self._pool = await asyncio.wait_for(
+                    loop.run_in_executor(self._executor, self._create_pool),
+                    timeout=self.query_timeout,
+                )
+                logging.info(f"Pool MySQL aberto com {self.pool_size} conexões.")
+            except Exception as e:
+                logging.error(f"Erro ao conectar ao banco de dados MySQL: {e}")
+                raise
+
+    async def close(self):
+        async with self._lock:
+            if self._pool is not None and self._executor is not None:
+                # Fecha as conexões ociosas do pool (as que estiverem em uso voltam a ele e fecham com o processo)
+                try:
+                    closed = await asyncio.wait_for(
+                        asyncio.get_running_loop().run_in_executor(self._executor, self._pool._remove_connections),
+                        timeout=self.query_timeout,
+                    )
+                    logging.info(f"Pool MySQL fechado ({closed} conexões encerradas).")
+                except Exception as e:
+                    logging.warning(f"Falha ao fechar as conexões do pool MySQL: {e}")
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._pool = None
+            self._last_used.clear()
+
+    def _run_query(self, query: str, params, fetch: str, many: bool):
+        db = self._pool.get_connection()
+        cursor = None
+        try:
+            # Só testa a conexão se ficou ociosa (o servidor ou a rede podem tê-la derrubado) ou se a última
+            # consulta nela falhou; no caminho comum a consulta vai direto, sem a volta extra do ping
+            last_used = self._last_used.pop(db.connection_id, None)
+            if last_used is None or time.monotonic() - last_used > self.ping_idle:
+                db.ping(reconnect=True, attempts=1, delay=0)
+            cursor = db.cursor(dictionary=True)
+            if many:
+                cursor.executemany(query, params)
+            else:
+                cursor.execute(query, params)
+            if fetch == "one":
+                result = cursor.fetchone()
+            elif fetch == "all":
+                result = cursor.fetchall()
+            else:
+                db.commit()
+                result = cursor.rowcount
+            self._last_used[db.connection_id] = time.monotonic()
+            return result
+        finally:
+            if cursor: cursor.close()
+            db.close()
+
+    async def _execute(self, query: str, params=None, fetch: str = None, many: bool = False):
+        if self._pool is None:
+            await self.open()
+        loop = asyncio.get_running_loop()
+        # Margem para o erro de max_execution_time chegar do servidor; esgotado este prazo, a consulta
+        # (se não for um SELECT) segue ocupando a thread e a conexão
+        return await asyncio.wait_for(
+            loop.run_in_executor(self._executor, self._run_query, query, params, fetch, many),
+            timeout=self.query_timeout + 1,
+        )
+
+    async def fetchone(self, query: str, params=None):
+        return await self._execute(query, params, fetch="one")
+
+    async def fetchall(self, query: str, params=None) -> list:
+        return await self._execute(query, params, fetch="all")
+
+    async def execute(self, query: str, params=None) -> int:
+        return await self._execute(query, params)
+
+    async def executemany(self, query: str, params: list) -> int:
+        return await self._execute(query, params, many=True)
+
+    async def health_check(self) -> bool:
+        try:
+            return await self.fetchone("SELECT 1 AS ok") is not None
+        except Exception as e:
+            logging.warning(f"Health check do MySQL falhou: {e}")
+            return False
+
+
+db_pool = DbPool()
@@ -1,21 +1,114 @@
+import asyncio
 import logging
+import os
+import time
 
-from db_auth.db_connector import get_db
+from db_auth.db_connector import db_pool
 
 
-def authorized_user(user_id: int) -> bool:
-    db, cursor = None, None
+class AuthorizedUsers:
+    """Snapshot em memória da tabela n2users, recarregado em segundo plano."""
+
+    def __init__(self):
+        self._ids = frozenset()
+        self._checksum = None
+        self.loaded_at = None
+        self._task = None
+
+    @property
+    def refresh_interval(self) -> float:
+        return float(os.environ.get('N2BOT_AUTH_REFRESH_INTERVAL', 60))
+
+    @property
+    def max_staleness(self) -> float:
+        return float(os.environ.get('N2BOT_AUTH_MAX_STALENESS', 300))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def is_fresh(self) -> bool:
+        return self.loaded_at is not None and time.time() - self.loaded_at <= self.max_staleness
+
+    def lookup(self, user_id: int):
+        # None indica snapshot ausente ou velho demais para garantir o prazo de revogação
+        if not self.is_fresh():
+            return None
+        return str(user_id) in self._ids
+
+    async def refresh(self) -> bool:
+        row = await db_pool.fetchone("CHECKSUM TABLE n2users")
+        checksum = row.get("Checksum") if row else None
+        if checksum is not None and checksum == self._checksum:
+            self.loaded_at = time.time()
+            return False
+
+        rows = await db_pool.fetchall("SELECT telegramid FROM n2users")
+        self._ids = frozenset(str(r["telegramid"]).strip() for r in rows if r.get("telegramid") is not None)
+        self._checksum = checksum
+        self.loaded_at = time.time()
+        logging.info(f"Snapshot de usuários autorizados recarregado: {len(self._ids)} usuários.")
+        return True
+
+    def dump(self) -> dict:
+        return {"ids": sorted(self._ids), "checksum": self._checksum, "loaded_at": self.loaded_at}
+
+    def load(self, data: dict) -> bool:
+        """Restaura um snapshot salvo; só vale enquanto estiver dentro de max_staleness, como o carregado do banco."""
+        loaded_at = data.get("loaded_at")
+        if not loaded_at or time.time() - loaded_at > self.max_staleness:
+            return False
+        if self.loaded_at is not None and self.loaded_at >= loaded_at:
+            return False
+        self._ids = frozenset(str(i) for i in data.get("ids", []))
+        self._checksum = data.get("checksum")
+        self.loaded_at = loaded_at
+        return True
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.warning(f"Falha ao atualizar snapshot de usuários autorizados: {e}")
+
+    async def start(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logging.warning(f"Snapshot inicial de usuários autorizados indisponível: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+authorized_users = AuthorizedUsers()
+
+
+async def _query_user(user_id: int) -> bool:
     try:
-        db, cursor = get_db()
         query = "SELECT 1 FROM n2users WHERE telegramid = %s"
-        cursor.execute(query, (user_id,))
-        if cursor.fetchone():
+        if await db_pool.fetchone(query, (user_id,)):
             return True
         else:
             logging.warning(f"Tentativa de acesso não autorizado pelo usuário com ID: {user_id}")
             return
     except Exception:
         logging.exception(f"Erro no banco de dados ao verificar permissão para o usuário {user_id}")
-    finally:
-        if cursor: cursor.close()
-        if db: db.close()
+
+
+async def authorized_user(user_id: int) -> bool:
+    allowed = authorized_users.lookup(user_id)
+    if allowed is None:
+        return await _query_user(user_id)
+    if not allowed:
+        logging.warning(f"Tentativa de acesso não autorizado pelo usuário com ID: {user_id}")
+    return allowed
@@ -9,6 +9,7 @@ class CpeStatus:
     def __init__(self):
         self.base_url = os.environ.get('N2BOT_CPESTATUS_URL')
         self.path = '/acs/cpestatus/'
+        self.hedge_after = float(os.environ.get('N2BOT_CPE_HEDGE_AFTER', 0)) or None
         self.req = reqs.RequestsMethods()
 
     async def get_cep_status(self, client_id: str, user) -> dict:
@@ -22,7 +23,7 @@ class CpeStatus:
         msg = msgs.BotMessage(user)
 
         try:
-            result = await self.req.get(url)
+            result = await self.req.get(url, hedge_after=self.hedge_after)
 
             if result.get("error"):
                 logging.error(f"Falha na requisição para a API de CPE: {result.get('message')}")
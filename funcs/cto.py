@@ -3,6 +3,10 @@ import os
 
 import utils.messages as msgs
 import utils.requests as reqs
+from funcs.topology import replica
+from utils.cache import box_cache, box_name_cache, box_payload_ok
+from utils.fetch_context import FetchContext
+from utils.taskgraph import TaskGraph
 
 
 class CtoData:
@@ -16,60 +20,79 @@ class CtoData:
         self.path_reservation = '/searchreservations?reservation_id='
         self.req = reqs.RequestsMethods()
 
-    async def validate_pon_port(self, point_id: str) -> dict:
+    async def validate_pon_port(self, point_id: str, fetch_ctx: FetchContext = None) -> dict:
         url_point = f"{self.base_url}{self.path_getpoint}{point_id}"
         header = {"Token": self.token}
+        ctx = fetch_ctx or FetchContext()
 
-        data = await self.req.get(url_point, headers=header)
+        data = await replica.get("point", point_id, lambda: ctx.get(self.req, url_point, headers=header))
         if data.get("error"):
             print(f"Erro ao validar porta PON: {data['message']}")
             return True
         return data.get("result", {}).get("point", {}).get("pon_port", True)
 
-    async def get_name_boxid(self, context):
+    async def get_name_boxid(self, context, fetch_ctx: FetchContext = None):
         box_name = context.args[0]
         header = {"Token": self.token}
+        ctx = fetch_ctx or FetchContext()
+        box_id = box_name_cache.get(box_name.lower())
+        if box_id is not None:
+            return box_id
         url_search = f"{self.base_url}{self.path_boxname}{box_name}"
-        response = await self.req.get(url_search, headers=header)
+        response = await replica.get("name", box_name, lambda: ctx.get(self.req, url_search, headers=header))
 
         results = response.get("results", [])
         if not results:
             return None
 
-        return results[0].get("box_id")
+        box_id = results[0].get("box_id")
+        if box_id is not None:
+            box_name_cache.set(box_name.lower(), box_id)
+        return box_id
     
-    async def get_client_signal_status(self, client_id: str, service_hsi: str, box_id: str = None) -> dict:
+    def _select_box_id(self, results: list, service_hsi: str):
+        code_box = None
+        if len(results) == 1:
+            code_box = results[0].get("box_id")
+            if service_hsi:
+                cod_srv_hsi = results[0].get("point", {}).get("attributes", {}).get("cod_srv_hsi")
+                if cod_srv_hsi != str(service_hsi):
+                    code_box = None
+        elif service_hsi:
+            for cto in results:
+                cod_srv_hsi = cto.get("point", {}).get("attributes", {}).get("cod_srv_hsi")
+                if cod_srv_hsi == str(service_hsi):
+                    code_box = cto.get("box_id")
+                    break
+
+        if not code_box and results:
+            code_box = results[0].get("box_id")
+        return code_box
+
+    async def get_client_signal_status(self, client_id: str, service_hsi: str, box_id: str = None,
+                                       client_results: list = None, fetch_ctx: FetchContext = None) -> dict:
         header = {"Token": self.token}
+        ctx = fetch_ctx or FetchContext()
         code_box = box_id
 
         if not code_box:
-            url = f"{self.base_url}{self.path_client}{client_id}"
-            data = await self.req.get(url, headers=header)
-            if data.get("error"):
-                return f"Erro ao obter dados do cliente: {data['message']}"
-            
-            results = data.get('results', [])
-            if len(results) == 1:
-                code_box = results[0].get("box_id")
-                if service_hsi:
-                    cod_srv_hsi = results[0].get("point", {}).get("attributes", {}).get("cod_srv_hsi")
-                    if cod_srv_hsi != str(service_hsi):
-                        code_box = None
-            elif service_hsi:
-                for cto in results:
-                    cod_srv_hsi = cto.get("point", {}).get("attributes", {}).get("cod_srv_hsi")
-                    if cod_srv_hsi == str(service_hsi):
-                        code_box = cto.get("box_id")
-                        break
-            
-            if not code_box and results:
-                code_box = results[0].get("box_id")
+            if client_results is None:
+                url = f"{self.base_url}{self.path_client}{client_id}"
+                data = await replica.get("client", client_id, lambda: ctx.get(self.req, url, headers=header))
+                if data.get("error"):
+                    return f"Erro ao obter dados do cliente: {data['message']}"
+                client_results = data.get('results', [])
+            code_box = self._select_box_id(client_results, service_hsi)
 
         if not code_box:
             return {"error": True, "message": "Nenhum CTO/Box ID encontrado para o cliente."}
         
         url_box = f"{self.base_url}{self.path_getbox}{code_box}"
-        data_box = await self.req.get(url_box, headers=header)
+        data_box = await box_cache.get_or_fetch(
+            str(code_box),
+            lambda: replica.get("box", code_box, lambda: ctx.get(self.req, url_box, headers=header)),
+            cacheable=box_payload_ok,
+        )
 
         if data_box.get("error"):
             return f"Erro ao obter dados da box: {data_box['message']}"
@@ -92,43 +115,94 @@ class CtoData:
 
         return {"error": True, "message": "Sinal não encontrado para o cliente na box especificada."}
     
-    async def process_check(self, client_id: str, service_hsi: str, user) -> dict:
+    def _build_check_graph(self, client_id: str, service_hsi: str, ctx: FetchContext) -> TaskGraph:
+        header = {"Token": self.token}
+        graph = TaskGraph()
+
+        async def reservas():
+            return await ctx.get(self.req, f"{self.base_url}{self.path_reservation}{client_id}", headers=header)
+
+        async def cliente():
+            url_client = f"{self.base_url}{self.path_client}{client_id}"
+            return await replica.get("client", client_id, lambda: ctx.get(self.req, url_client, headers=header))
+
+        async def reserva_alvo(reservas_data):
+            for res in reservas_data.get("results", []):
+                if res.get("status_id") == 4 and (not service_hsi or res.get("attributes", {}).get("cod_srv_hsi") == service_hsi):
+                    return res
+            return None
+
+        async def pon_reserva(res):
+            return await self.validate_pon_port(res.get("point_id"), fetch_ctx=ctx)
+
+        async def sinal_reserva(res):
+            serv = service_hsi or res.get("attributes", {}).get("cod_srv_hsi")
+            return await self.get_client_signal_status(client_id, serv, box_id=res.get("box", {}).get("box_id"), fetch_ctx=ctx)
+
+        async def servico_alvo(client_data):
+            results_cliente = client_data.get("results", [])
+            if service_hsi:
+                target = next((p for p in results_cliente if p.get("point", {}).get("attributes", {}).get("cod_srv_hsi") == str(service_hsi)), None)
+                return target, service_hsi
+            if len(results_cliente) == 1:
+                target = results_cliente[0]
+                return target, target.get("point", {}).get("attributes", {}).get("cod_srv_hsi")
+            return None, service_hsi
+
+        async def pon_cliente(alvo):
+            target, _ = alvo
+            return await self.validate_pon_port(target.get("point", {}).get("point_id"), fetch_ctx=ctx)
+
+        async def sinal_cliente(client_data, alvo):
+            _, serv = alvo
+            return await self.get_client_signal_status(client_id, serv, client_results=client_data.get("results", []), fetch_ctx=ctx)
+
+        graph.add("reservas", reservas)
+        graph.add("cliente", cliente)
+        graph.add("reserva_alvo", reserva_alvo, "reservas")
+        graph.add("pon_reserva", pon_reserva, "reserva_alvo")
+        graph.add("sinal_reserva", sinal_reserva, "reserva_alvo")
+        graph.add("servico_alvo", servico_alvo, "cliente")
+        graph.add("pon_cliente", pon_cliente, "servico_alvo")
+        graph.add("sinal_cliente", sinal_cliente, "cliente", "servico_alvo")
+        return graph
+
+    async def process_check(self, client_id: str, service_hsi: str, user, fetch_ctx: FetchContext = None) -> dict:
         if not self.base_url:
             return {"message": "⚠️ Erro interno: URLs das APIs não configuradas corretamente."}
 
-        header = {"Token": self.token}
         msg_handler = msgs.BotMessage(user)
+        graph = self._build_check_graph(client_id, service_hsi, fetch_ctx or FetchContext())
 
         try:
-            url_reserva = f"{self.base_url}{self.path_reservation}{client_id}"
-            reservas_data = await self.req.get(url_reserva, headers=header)
-            
-            for res in reservas_data.get("results", []):
-                if res.get("status_id") == 4 and (not service_hsi or res.get("attributes", {}).get("cod_srv_hsi") == service_hsi):
-                    if not service_hsi:
-                        service_hsi = res.get("attributes", {}).get("cod_srv_hsi")
-
-                    if not await self.validate_pon_port(res.get("point_id")):
-                        msg = "A porta reservada para este cliente não possui uma porta PON válida. Revise a reserva deste cliente!"
-                        return {"message": msg_handler.mensagem_cto_data().format(cli=client_id, serv=service_hsi or "N/A", msg=msg, signal="", status="")}
-                    
-                    box_info = res.get("box", {})
-                    box_id = box_info.get("box_id")
-                    box_name = box_info.get("box_full_name", "CTO desconhecida")
-                    point_name = res.get("point_name", "Ponto desconhecido")
-                    client_status_info = await self.get_client_signal_status(client_id, service_hsi, box_id=box_id)
-                    signal_str = f"{client_status_info.get('verified_signal')} dBm\n" if client_status_info.get("verified_signal") else ""
-                    status_str = res.get("status_name", "") + "\n" if res.get("status_name") else ""
-
-                    keyboard = [[{"text": f"Ver Detalhes da CTO {box_name}", "callback_data": f"cto_full_{box_id}"}]] if box_id else []
-                    
-                    return {
-                        "message": msg_handler.mensagem_cto_data().format(cli=client_id, serv=service_hsi or "N/A", signal=signal_str, status=status_str, cto=box_name, point=point_name),
-                        "reply_markup": {"inline_keyboard": keyboard}
-                    }
+            # Reservas e busca do cliente são independentes: ambas partem juntas
+            graph.start("reservas", "cliente")
 
-            url_client = f"{self.base_url}{self.path_client}{client_id}"
-            client_data = await self.req.get(url_client, headers=header)
+            res = await graph.result("reserva_alvo")
+            if res:
+                if not service_hsi:
+                    service_hsi = res.get("attributes", {}).get("cod_srv_hsi")
+
+                pon_valida, client_status_info = await graph.results("pon_reserva", "sinal_reserva")
+                if not pon_valida:
+                    msg = "A porta reservada para este cliente não possui uma porta PON válida. Revise a reserva deste cliente!"
+                    return {"message": msg_handler.mensagem_cto_data().format(cli=client_id, serv=service_hsi or "N/A", msg=msg, signal="", status="")}
+
+                box_info = res.get("box", {})
+                box_id = box_info.get("box_id")
+                box_name = box_info.get("box_full_name", "CTO desconhecida")
+                point_name = res.get("point_name", "Ponto desconhecido")
+                signal_str = f"{client_status_info.get('verified_signal')} dBm\n" if client_status_info.get("verified_signal") else ""
+                status_str = res.get("status_name", "") + "\n" if res.get("status_name") else ""
+
+                keyboard = [[{"text": f"Ver Detalhes da CTO {box_name}", "callback_data": f"cto_full_{box_id}"}]] if box_id else []
+
+                return {
+                    "message": msg_handler.mensagem_cto_data().format(cli=client_id, serv=service_hsi or "N/A", signal=signal_str, status=status_str, cto=box_name, point=point_name),
+                    "reply_markup": {"inline_keyboard": keyboard}
+                }
+
+            client_data = await graph.result("cliente")
             results_cliente = client_data.get("results", [])
 
             if not results_cliente:
@@ -141,7 +215,7 @@ class CtoData:
                     serv_id = service.get("point", {}).get("attributes", {}).get("cod_srv_hsi", "N/A")
                     box_name = service.get("box_full_name", "CTO desconhecida")
                     services_list.append(f"⚙️ Serviço <code>{serv_id}</code> na CTO <code>{box_name}</code>")
-                
+
                 message = (
                     f"⚠️ Cliente <b>{client_id}</b> possui múltiplos serviços ativos.\n\n"
                     f"Por favor, especifique o código do serviço desejado.\n\n"
@@ -150,27 +224,22 @@ class CtoData:
                 )
                 return {"message": message}
 
-            target_service_data = None
-            if service_hsi:
-                target_service_data = next((p for p in results_cliente if p.get("point", {}).get("attributes", {}).get("cod_srv_hsi") == str(service_hsi)), None)
-            elif len(results_cliente) == 1:
-                target_service_data = results_cliente[0]
-                service_hsi = target_service_data.get("point", {}).get("attributes", {}).get("cod_srv_hsi")
+            target_service_data, service_hsi = await graph.result("servico_alvo")
 
             if target_service_data and target_service_data.get("point", {}).get("status_id") == 8:
-                point_info = target_service_data.get("point", {})
-                if not await self.validate_pon_port(point_info.get("point_id")):
+                # Validação da PON e leitura da box no caminho crítico, em paralelo
+                pon_valida, client_status_info = await graph.results("pon_cliente", "sinal_cliente")
+                if not pon_valida:
                     return {"message": "A porta do cliente não possui uma PON válida. Revise o registro!"}
 
                 box_id_cliente = target_service_data.get("box_id")
                 box_name_cliente = target_service_data.get("box_full_name", "CTO desconhecida")
                 point_name = target_service_data.get("point", {}).get("point_name", "Ponto desconhecido")
-                client_status_info = await self.get_client_signal_status(client_id, service_hsi)
                 signal_str = f"{client_status_info.get('verified_signal')} dBm\n" if client_status_info.get("verified_signal") else ""
                 status_str = f"{client_status_info.get('status_name')}\n" if client_status_info.get("status_name") else ""
-                
+
                 keyboard = [[{"text": f"Ver Detalhes da CTO {box_name_cliente}", "callback_data": f"cto_full_{box_id_cliente}"}]] if box_id_cliente else []
-                
+
                 return {
                     "message": msg_handler.mensagem_cto_data().format(cli=client_id, serv=service_hsi or "N/A", signal=signal_str, status=status_str, cto=box_name_cliente, point=point_name),
                     "reply_markup": {"inline_keyboard": keyboard}
@@ -185,3 +254,5 @@ class CtoData:
         except Exception as e:
             logging.exception(f"Erro ao processar a verificação CTO para o cliente {client_id}: {e}")
             return {"message": "⚠️ Ocorreu um erro inesperado. Tente novamente mais tarde."}
+        finally:
+            graph.cancel_pending()
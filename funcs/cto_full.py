@@ -1,10 +1,15 @@
 import asyncio
 import logging
 import os
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List
 
 import utils.convert_funcs as cfs
 import utils.requests as reqs
+import utils.scheduler as scheduler
+from funcs.topology import replica
+from utils.cache import box_cache, box_payload_ok
+from utils.fetch_context import FetchContext
+from utils.metrics import box_fanout
 
 
 class CtoFull:
@@ -14,14 +19,20 @@ class CtoFull:
         self.url_cpe = os.environ.get("N2BOT_CPESTATUS_URL")
         self.cpe_path = "/acs/cpestatus/"
         self.box_path = '/getbox?box_id='
+        self.hedge_after = float(os.environ.get('N2BOT_CPE_HEDGE_AFTER', 0)) or None
         self.req = reqs.RequestsMethods()
         self.cf = cfs.ConvertFuncs()
 
-    async def get_cto_data_by_box(self, box_id: str) -> dict:
+    async def get_cto_data_by_box(self, box_id: str, fetch_ctx: FetchContext = None) -> dict:
         url = f"{self.base_url}{self.box_path}{box_id}"
         headers = {"Token": self.token}
+        ctx = fetch_ctx or FetchContext()
 
-        data = await self.req.get(url, headers=headers, timeout=60)
+        data = await box_cache.get_or_fetch(
+            str(box_id),
+            lambda: replica.get("box", box_id, lambda: ctx.get(self.req, url, headers=headers, timeout=60, slow_after=60)),
+            cacheable=box_payload_ok,
+        )
 
         if data.get("error"):
             logging.error(f"Erro ao consultar API da CTO (box_id={box_id}): {data.get('message')}")
@@ -42,7 +53,7 @@ class CtoFull:
 
         return result
 
-    async def _fetch_cpe_status_for_point(self, point: Dict[str, Any]) -> Dict[str, Any]:
+    async def _fetch_cpe_status_for_point(self, point: Dict[str, Any], ctx: FetchContext) -> Dict[str, Any]:
         attributes = point.get("attributes", {})
         cod_srv_hsi = attributes.get("cod_srv_hsi")
         cod_cli_active = attributes.get("cod_cli_active")
@@ -51,7 +62,9 @@ class CtoFull:
             return {}
 
         url_cpe = f"{self.url_cpe}{self.cpe_path}{cod_cli_active}"
-        data_cpe = await self.req.get(url_cpe)
+        # Varredura da CTO: cede a vez às consultas de um único cliente
+        with scheduler.priority_scope(scheduler.BULK):
+            data_cpe = await ctx.get(self.req, url_cpe, hedge_after=self.hedge_after)
 
         if data_cpe.get("error"):
             logging.warning(f"Erro ao consultar CPE do cliente {cod_cli_active}: {data_cpe.get('message')}")
@@ -83,11 +96,14 @@ class CtoFull:
 
         return {cod_cli_active: {"Sinal": sinal, "state": state}}
 
-    async def get_status_box(self, box_id: str, points: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    async def get_status_box(self, box_id: str, points: List[Dict[str, Any]],
+                             fetch_ctx: FetchContext = None) -> Dict[str, Dict[str, Any]]:
         cpe_status_data = {}
+        ctx = fetch_ctx or FetchContext()
         logging.info(f"Iniciando verificação da box_id: {box_id} com {len(points)} pontos.")
+        box_fanout.observe(len(points))
 
-        tasks = [self._fetch_cpe_status_for_point(point) for point in points]
+        tasks = [self._fetch_cpe_status_for_point(point, ctx) for point in points]
 
         results = await asyncio.gather(*tasks)
 
@@ -97,3 +113,27 @@ class CtoFull:
 
         logging.info(f"Finalizada verificação da box_id: {box_id}")
         return cpe_status_data
+
+    async def iter_status_box(self, box_id: str, points: List[Dict[str, Any]],
+                              fetch_ctx: FetchContext = None) -> AsyncIterator[Dict[str, Dict[str, Any]]]:
+        """Entrega o status de cada CPE da box à medida que as consultas terminam."""
+        ctx = fetch_ctx or FetchContext()
+        logging.info(f"Iniciando verificação progressiva da box_id: {box_id} com {len(points)} pontos.")
+        box_fanout.observe(len(points))
+
+        tasks = {asyncio.ensure_future(self._fetch_cpe_status_for_point(point, ctx)): point for point in points}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    res_dict = await next_done
+                except Exception as e:
+                    logging.warning(f"Erro ao consultar CPE na box_id {box_id}: {e}")
+                    continue
+                if res_dict:
+                    yield res_dict
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+        logging.info(f"Finalizada verificação progressiva da box_id: {box_id}")
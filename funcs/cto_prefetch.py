@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import utils.audit as audit
+import utils.deadline as deadline
+from utils.fetch_context import FetchContext
+from utils.metrics import Counter, Gauge, registry, snapshot
+
+
+class _Prefetch:
+    __slots__ = ("task", "ctx", "started_at")
+
+    def __init__(self, task: asyncio.Task, ctx: FetchContext):
+        self.task = task
+        self.ctx = ctx
+        self.started_at = time.monotonic()
+
+
+class CtoPrefetcher:
+    """Busca em segundo plano os dados da box quando o botão "Ver Detalhes da CTO" é oferecido.
+
+    Só a chamada à API de CTO é antecipada (uma por /cto, e nenhuma se a box já estiver no `box_cache`);
+    o status das CPEs, que custa uma consulta por ponto, só é buscado se o técnico tocar no botão.
+    Guarda no máximo `max_entries` boxes por até `ttl` segundos; o que não for usado nesse prazo (ou for
+    despejado) é cancelado e contado como trabalho desperdiçado.
+    """
+
+    def __init__(self, ctf):
+        self.ctf = ctf
+        self._entries = OrderedDict()
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return os.environ.get('N2BOT_CTO_PREFETCH', '1') == '1'
+
+    @property
+    def max_entries(self) -> int:
+        return int(os.environ.get('N2BOT_CTO_PREFETCH_MAX', 32))
+
+    @property
+    def ttl(self) -> float:
+        return float(os.environ.get('N2BOT_CTO_PREFETCH_TTL', 60))
+
+    def offer(self, box_id):
+        """Inicia a busca antecipada da box, se ainda não houver uma válida para ela."""
+        if not self.enabled or not box_id:
+            return
+        box_id = str(box_id)
+        self._expire()
+        if box_id in self._entries:
+            return
+        while len(self._entries) >= self.max_entries:
+            _, oldest = self._entries.popitem(last=False)
+            self._discard(oldest)
+        ctx = FetchContext("cto_prefetch")
+        entry = _Prefetch(None, ctx)
+        # Prazo próprio (a busca continua depois que o comando /cto termina) e falhas fora da auditoria do /cto
+        with deadline.detached_scope(self.ttl), audit.command_scope():
+            entry.task = asyncio.create_task(self.ctf.get_cto_data_by_box(box_id, fetch_ctx=ctx))
+        self._entries[box_id] = entry
+        self.started += 1
+
+    async def take(self, box_id):
+        """Devolve os dados da box da busca antecipada (esperando-a se ainda estiver em andamento) ou None."""
+        self._expire()
+        entry = self._entries.pop(str(box_id), None)
+        if entry is None:
+            self.misses += 1
+            return None
+        try:
+            # Sem o shield, cancelar o callback cancelaria a busca e o cancelamento seria engolido como falta
+            result = await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            if asyncio.current_task().cancelling() or not entry.task.cancelled():
+                if not entry.task.done():
+                    # A busca segue válida para o próximo toque no botão
+                    self._entries.setdefault(str(box_id), entry)
+                raise
+            self.misses += 1
+            return None
+        except Exception as e:
+            logging.warning(f"Busca antecipada da CTO {box_id} falhou: {e}")
+            self.misses += 1
+            return None
+        if not result:
+            # Falha transitória da API de CTO: o callback tenta de novo ao vivo
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._entries:
+            box_id, entry = next(iter(self._entries.items()))
+            if now - entry.started_at < self.ttl:
+                break
+            del self._entries[box_id]
+            self._discard(entry)
+
+    def _discard(self, entry: _Prefetch):
+        self.wasted += 1
+        if not entry.task.done():
+            entry.task.cancel()
+        entry.ctx.cancel()
+        if entry.task.done() and not entry.task.cancelled():
+            # Evita o aviso de exceção nunca recuperada
+            entry.task.exception()
+
+    async def stop(self):
+        entries = list(self._entries.values())
+        self._entries.clear()
+        for entry in entries:
+            entry.task.cancel()
+            entry.ctx.cancel()
+        await asyncio.gather(*(entry.task for entry in entries), return_exceptions=True)
+
+    def stats(self) -> dict:
+        taken = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "wasted": self.wasted,
+            "hit_rate": round(self.hits / taken, 3) if taken else 0.0,
+        }
+
+
+prefetcher = None
+
+
+def _collect_prefetch():
+    if prefetcher is None:
+        return []
+    stats = prefetcher.stats()
+    return [
+        snapshot(Counter, "n2bot_cto_prefetch_total", "Buscas antecipadas de CTO por resultado.",
+                 {(result,): stats[result] for result in ("started", "hits", "misses", "wasted")}, ("result",)),
+        snapshot(Gauge, "n2bot_cto_prefetch_entries", "Buscas antecipadas de CTO guardadas.", {(): stats["entries"]}),
+    ]
+
+
+registry.add_collector(_collect_prefetch)
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+from urllib.parse import quote
+
+import utils.requests as reqs
+from funcs.topology import replica
+from utils.cache import box_name_cache, inline_search_cache
+from utils.metrics import Counter, registry, snapshot
+
+
+class InlineSearch:
+    """Busca de CTOs por nome e de serviços por código de cliente para o modo inline (`@bot SPO-A0`).
+
+    Cada tecla gera uma consulta: as respostas são memoizadas por prefixo, as consultas de um mesmo usuário
+    esperam `debounce` segundos (só a mais recente segue) e as chamadas à API de CTO são limitadas.
+    """
+
+    def __init__(self):
+        self.token = os.environ.get('N2BOT_CTO_TOKEN')
+        self.base_url = os.environ.get('N2BOT_CTO_URL')
+        self.path_boxname = '/searchbox?box_name='
+        self.path_client = '/searchclient?cod_cli='
+        self.req = reqs.RequestsMethods()
+        self._latest = {}
+        self._semaphore = asyncio.Semaphore(int(os.environ.get('N2BOT_INLINE_MAX_CONCURRENCY', 4)))
+        self.totals = {"memo": 0, "prefix": 0, "fetched": 0, "superseded": 0}
+
+    @property
+    def debounce(self) -> float:
+        return float(os.environ.get('N2BOT_INLINE_DEBOUNCE', 0.3))
+
+    @property
+    def min_chars(self) -> int:
+        return int(os.environ.get('N2BOT_INLINE_MIN_CHARS', 3))
+
+    @property
+    def page_size(self) -> int:
+        # A partir desse tamanho a resposta da API pode estar truncada e não serve para prefixos mais longos
+        return int(os.environ.get('N2BOT_INLINE_PAGE_SIZE', 50))
+
+    def _memoized(self, kind: str, query: str):
+        cached = inline_search_cache.get((kind, query))
+        if cached is not None:
+            self.totals["memo"] += 1
+            return cached[0]
+        if kind != "box":
+            return None
+        for size in range(len(query) - 1, self.min_chars - 1, -1):
+            cached = inline_search_cache.get((kind, query[:size]))
+            if cached is not None and cached[1]:
+                results = [box for box in cached[0] if query in box["name"].upper()]
+                inline_search_cache.set((kind, query), (results, True))
+                self.totals["prefix"] += 1
+                return results
+        return None
+
+    async def search(self, user_id, text: str):
+        """Devolve `(tipo, resultados)`, ou None quando a consulta foi substituída por outra mais nova do usuário."""
+        query = text.strip().upper()
+        kind = "client" if query.isdigit() else "box"
+        if kind == "box" and len(query) < self.min_chars:
+            return kind, []
+        results = self._memoized(kind, query)
+        if results is not None:
+            return kind, results
+
+        generation = self._latest[user_id] = self._latest.get(user_id, 0) + 1
+        try:
+            await asyncio.sleep(self.debounce)
+            if self._latest.get(user_id) != generation:
+                self.totals["superseded"] += 1
+                return None
+            async with self._semaphore:
+                if self._latest.get(user_id) != generation:
+                    self.totals["superseded"] += 1
+                    return None
+                # Outro usuário pode ter buscado o mesmo prefixo enquanto esta esperava
+                results = self._memoized(kind, query)
+                if results is not None:
+                    return kind, results
+                self.totals["fetched"] += 1
+                results = await (self._fetch_boxes(query) if kind == "box" else self._fetch_services(query))
+            return kind, results
+        finally:
+            if self._latest.get(user_id) == generation:
+                del self._latest[user_id]
+
+    async def _fetch_boxes(self, query: str) -> list:
+        header = {"Token": self.token}
+        # Texto livre do usuário: espaço, "&", "#" ou "?" corromperiam a URL ou injetariam parâmetros
+        url = f"{self.base_url}{self.path_boxname}{quote(query, safe='')}"
+        data = await self.req.get(url, headers=header, timeout=10)
+        if data.get("error") or data.get("status_code"):
+            logging.warning(f"Busca inline de CTO '{query}' falhou: {data.get('message', data.get('status_code'))}")
+            return []
+        items = data.get("results", [])
+        boxes = []
+        for item in items:
+            box_id = item.get("box_id")
+            if box_id is None:
+                continue
+            name = item.get("box_full_name") or item.get("box_name") or query
+            boxes.append({"box_id": box_id, "name": name})
+            # O /cto <nome> seguinte já encontra o box_id sem ir à API
+            box_name_cache.set(name.lower(), box_id)
+        inline_search_cache.set(("box", query), (boxes, len(items) < self.page_size))
+        return boxes
+
+    async def _fetch_services(self, client_id: str) -> list:
+        header = {"Token": self.token}
+        url = f"{self.base_url}{self.path_client}{quote(client_id, safe='')}"
+        data = await replica.get("client", client_id, lambda: self.req.get(url, headers=header, timeout=10))
+        if data.get("error") or data.get("status_code"):
+            logging.warning(f"Busca inline do cliente {client_id} falhou: {data.get('message', data.get('status_code'))}")
+            return []
+        services = []
+        for item in data.get("results", []):
+            point = item.get("point", {})
+            services.append({
+                "client_id": client_id,
+                "service": point.get("attributes", {}).get("cod_srv_hsi", "N/A"),
+                "box_id": item.get("box_id"),
+                "name": item.get("box_full_name", "CTO desconhecida"),
+                "point": point.get("point_name", "N/A"),
+            })
+        inline_search_cache.set(("client", client_id), (services, True))
+        return services
+
+
+inline_search = None
+
+
+def _collect_inline_search():
+    if inline_search is None:
+        return []
+    return [snapshot(Counter, "n2bot_inline_search_total", "Consultas inline por origem da resposta.",
+                     {(result,): count for result, count in inline_search.totals.items()}, ("result",))]
+
+
+registry.add_collector(_collect_inline_search)
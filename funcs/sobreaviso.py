@@ -1,23 +1,133 @@
+import asyncio
 import logging
 import os
+import time
+from datetime import datetime, timedelta
 
 import utils.messages as msgs
 import utils.requests as reqs
 
+DATETIME_FORMATS = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M")
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d")
+
+
+def parse_period(value, end: bool = False):
+    if not value:
+        return None
+    value = str(value).strip()
+    for fmt in DATETIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    for fmt in DATE_FORMATS:
+        try:
+            day = datetime.strptime(value, fmt)
+            return day + timedelta(days=1) if end else day
+        except ValueError:
+            continue
+    return None
+
 
 class Sobreaviso:
     def __init__(self):
         self.url = os.environ.get('N2BOT_SOBREAVISO_URL')
         self.path = "/api/sobreaviso"
         self.req = reqs.RequestsMethods()
+        self.schedule = []
+        self.fetched_at = None
+        self._task = None
 
-    async def sobreaviso_ope(self, user):
+    @property
+    def refresh_interval(self) -> float:
+        return float(os.environ.get('N2BOT_SOBREAVISO_REFRESH_INTERVAL', 900))
+
+    async def refresh(self) -> bool:
         url = f'{self.url}{self.path}'
+        data = await self.req.get(url)
+        if not data or (isinstance(data, dict) and data.get("error")):
+            logging.warning("Não foi possível atualizar a escala de sobreaviso; mantendo a última conhecida.")
+            return False
+        if isinstance(data, list):
+            self.schedule = [entry for entry in data if isinstance(entry, dict)]
+        elif isinstance(data.get("results"), list):
+            self.schedule = [entry for entry in data["results"] if isinstance(entry, dict)]
+        else:
+            self.schedule = [data]
+        self.fetched_at = time.time()
+        return True
+
+    def dump(self) -> dict:
+        return {"schedule": self.schedule, "fetched_at": self.fetched_at}
+
+    def load(self, data: dict) -> bool:
+        fetched_at = data.get("fetched_at")
+        schedule = data.get("schedule")
+        if not fetched_at or not isinstance(schedule, list) or (self.fetched_at or 0) >= fetched_at:
+            return False
+        self.schedule = [entry for entry in schedule if isinstance(entry, dict)]
+        self.fetched_at = fetched_at
+        return True
+
+    def current(self, now: datetime = None):
+        now = now or datetime.now()
+        started = None
+        for entry in self.schedule:
+            inicio = parse_period(entry.get("periodo_inicio"))
+            fim = parse_period(entry.get("periodo_fim"), end=True)
+            if inicio and fim and inicio <= now < fim:
+                return entry
+            if inicio and inicio <= now and (started is None or inicio > started[0]):
+                started = (inicio, entry)
+        # Sem período reconhecível cobrindo o horário: usa a escala iniciada mais recentemente
+        if started:
+            return started[1]
+        return self.schedule[0] if self.schedule else None
+
+    def _next_wakeup(self) -> float:
+        interval = self.refresh_interval
+        entry = self.current()
+        fim = parse_period(entry.get("periodo_fim"), end=True) if entry else None
+        if fim:
+            # Atualiza logo após a troca de plantão, mesmo antes do intervalo normal
+            until_end = (fim - datetime.now()).total_seconds() + 1
+            if 0 < until_end < interval:
+                return until_end
+        return interval
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self._next_wakeup())
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.error(f"Exceção ao atualizar a escala de sobreaviso: {e}")
+
+    async def start(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logging.error(f"Exceção ao carregar a escala de sobreaviso: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def sobreaviso_ope(self, user):
         msg = msgs.BotMessage(user)
         try:
-            data = await self.req.get(url)
-            if not data or data.get("error"):
-                logging.warning("message", "Erro: Não foi possível obter os dados de sobreaviso.")
+            if self.fetched_at is None:
+                await self.refresh()
+            data = self.current()
+            if not data:
+                logging.warning("Erro: Não foi possível obter os dados de sobreaviso.")
                 return msg.sobreaviso_error()
             response = msg.message_sobreaviso(data)
             return response
@@ -0,0 +1,334 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import utils.requests as reqs
+from utils.metrics import Counter, registry, snapshot
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS boxes (
+    box_id TEXT PRIMARY KEY,
+    box_name TEXT,
+    payload TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_boxes_name ON boxes (box_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_boxes_synced ON boxes (synced_at);
+
+CREATE TABLE IF NOT EXISTS box_names (
+    name TEXT PRIMARY KEY COLLATE NOCASE,
+    box_id TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS points (
+    point_id TEXT PRIMARY KEY,
+    box_id TEXT NOT NULL,
+    cod_cli_active TEXT,
+    cod_srv_hsi TEXT,
+    payload TEXT,
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_points_box ON points (box_id);
+
+CREATE TABLE IF NOT EXISTS clients (
+    cod_cli TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_clients_synced ON clients (synced_at);
+"""
+
+# Caminho de cada tipo de consulta na API de CTO (reservas são voláteis e sempre vão ao vivo)
+PATHS = {
+    "box": "/getbox?box_id=",
+    "point": "/getpoint?point_id=",
+    "client": "/searchclient?cod_cli=",
+    "name": "/searchbox?box_name=",
+}
+
+
+def payload_ok(data) -> bool:
+    return isinstance(data, dict) and not data.get("error") and not data.get("status_code")
+
+
+class TopologyStore:
+    """Réplica SQLite de boxes, pontos e clientes, indexada por nome e box_id da box, código do cliente e ponto.
+
+    Consultas por cliente usam a tabela `clients` (chave `cod_cli`) e a escolha do serviço é feita sobre os
+    resultados do cliente; por isso `points` não tem índice em `cod_cli_active`/`cod_srv_hsi`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _one(self, query: str, params: tuple):
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()
+
+    def read(self, kind: str, key: str, max_age: float):
+        min_synced = time.time() - max_age
+        if kind == "box":
+            row = self._one("SELECT payload FROM boxes WHERE box_id = ? AND synced_at >= ?", (key, min_synced))
+        elif kind == "point":
+            row = self._one("SELECT payload FROM points WHERE point_id = ? AND payload IS NOT NULL AND synced_at >= ?", (key, min_synced))
+        elif kind == "client":
+            row = self._one("SELECT payload FROM clients WHERE cod_cli = ? AND synced_at >= ?", (key, min_synced))
+        elif kind == "name":
+            row = self._one(
+                "SELECT box_id FROM box_names WHERE name = ? AND synced_at >= ? "
+                "UNION ALL SELECT box_id FROM boxes WHERE box_name = ? COLLATE NOCASE AND synced_at >= ? LIMIT 1",
+                (key, min_synced, key, min_synced),
+            )
+            return {"results": [{"box_id": row["box_id"]}]} if row else None
+        else:
+            return None
+        return json.loads(row["payload"]) if row else None
+
+    def write(self, kind: str, key: str, data: dict):
+        now = time.time()
+        with self._lock, self._conn:
+            if kind == "box":
+                self._write_box(key, data, now)
+            elif kind == "point":
+                point = data.get("result", {}).get("point", {})
+                attributes = point.get("attributes", {})
+                self._conn.execute(
+                    "INSERT INTO points (point_id, box_id, cod_cli_active, cod_srv_hsi, payload, synced_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(point_id) DO UPDATE SET "
+                    "payload = excluded.payload, synced_at = excluded.synced_at",
+                    (key, str(point.get("box_id", "")), attributes.get("cod_cli_active"),
+                     attributes.get("cod_srv_hsi"), json.dumps(data), now),
+                )
+            elif kind == "client":
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO clients (cod_cli, payload, synced_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(data), now),
+                )
+            elif kind == "name":
+                results = data.get("results", [])
+                if results and results[0].get("box_id") is not None:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO box_names (name, box_id, synced_at) VALUES (?, ?, ?)",
+                        (key, str(results[0]["box_id"]), now),
+                    )
+
+    def _write_box(self, box_id: str, data: dict, now: float):
+        result = data.get("result", {})
+        box_name = result.get("box_full_name")
+        previous = {
+            row["cod_cli_active"]
+            for row in self._conn.execute("SELECT cod_cli_active FROM points WHERE box_id = ?", (box_id,))
+            if row["cod_cli_active"]
+        }
+        self._conn.execute(
+            "INSERT OR REPLACE INTO boxes (box_id, box_name, payload, synced_at) VALUES (?, ?, ?, ?)",
+            (box_id, box_name, json.dumps(data), now),
+        )
+        current = set()
+        for point in result.get("points", []):
+            point_id = point.get("point_id")
+            if point_id is None:
+                continue
+            attributes = point.get("attributes", {})
+            cod_cli = attributes.get("cod_cli_active")
+            if cod_cli:
+                current.add(cod_cli)
+            self._conn.execute(
+                "INSERT INTO points (point_id, box_id, cod_cli_active, cod_srv_hsi, synced_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(point_id) DO UPDATE SET box_id = excluded.box_id, "
+                "cod_cli_active = excluded.cod_cli_active, cod_srv_hsi = excluded.cod_srv_hsi",
+                (str(point_id), box_id, cod_cli, attributes.get("cod_srv_hsi"), now),
+            )
+        # Clientes que entraram ou saíram da box deixam de ser servidos pela réplica até a próxima busca
+        for cod_cli_active in previous ^ current:
+            for cod_cli in cod_cli_active.split('/'):
+                self._conn.execute("DELETE FROM clients WHERE cod_cli = ?", (cod_cli,))
+
+    def forget_box(self, box_id: str):
+        """Remove a box que a API não encontra mais, com seus pontos, nomes e os clientes que a usavam."""
+        with self._lock, self._conn:
+            for row in self._conn.execute("SELECT cod_cli_active FROM points WHERE box_id = ?", (box_id,)).fetchall():
+                for cod_cli in (row["cod_cli_active"] or "").split('/'):
+                    self._conn.execute("DELETE FROM clients WHERE cod_cli = ?", (cod_cli,))
+            self._conn.execute("DELETE FROM points WHERE box_id = ?", (box_id,))
+            self._conn.execute("DELETE FROM box_names WHERE box_id = ?", (box_id,))
+            self._conn.execute("DELETE FROM boxes WHERE box_id = ?", (box_id,))
+
+    def stalest(self, kind: str, older_than: float, limit: int) -> list:
+        table, column = {"box": ("boxes", "box_id"), "client": ("clients", "cod_cli")}[kind]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {column} AS key FROM {table} WHERE synced_at < ? ORDER BY synced_at LIMIT ?",
+                (time.time() - older_than, limit),
+            ).fetchall()
+        return [row["key"] for row in rows]
+
+    def counts(self) -> dict:
+        with self._lock:
+            return {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("boxes", "box_names", "points", "clients")
+            }
+
+
+class TopologyReplica:
+    """Serve consultas de topologia da réplica local, com fallback para a API de CTO ao vivo.
+
+    A réplica é preenchida sob demanda: só boxes, pontos e clientes já consultados entram nela. A API de CTO
+    não tem listagem nem feed de alterações, então a sincronização em segundo plano apenas renova os registros
+    vencidos (em lotes de `sync_batch`) e remove as boxes que a API passou a não encontrar; boxes novas só
+    entram na réplica na primeira consulta.
+    """
+
+    def __init__(self):
+        self.store = None
+        self.req = reqs.RequestsMethods()
+        self._executor = None
+        self._task = None
+        self.hits = 0
+        self.misses = 0
+        self.stale_served = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.store is not None
+
+    @property
+    def fresh_age(self) -> float:
+        return float(os.environ.get('N2BOT_TOPOLOGY_FRESH_AGE', 900))
+
+    @property
+    def max_stale_age(self) -> float:
+        return float(os.environ.get('N2BOT_TOPOLOGY_MAX_STALE_AGE', 86400))
+
+    @property
+    def sync_interval(self) -> float:
+        return float(os.environ.get('N2BOT_TOPOLOGY_SYNC_INTERVAL', 300))
+
+    @property
+    def sync_batch(self) -> int:
+        return int(os.environ.get('N2BOT_TOPOLOGY_SYNC_BATCH', 20))
+
+    async def get(self, kind: str, key, fetch):
+        if not self.enabled:
+            return await fetch()
+        key = str(key)
+        data = await self._read(kind, key, self.fresh_age)
+        if data is not None:
+            self.hits += 1
+            return data
+        self.misses += 1
+        data = await fetch()
+        if payload_ok(data):
+            await self._write(kind, key, data)
+            return data
+        stale = await self._read(kind, key, self.max_stale_age)
+        if stale is not None:
+            self.stale_served += 1
+            logging.warning(f"API de CTO falhou para {kind}={key}; servindo dado da réplica local.")
+            return stale
+        return data
+
+    async def _read(self, kind: str, key: str, max_age: float):
+        # Fora do loop: a leitura disputa o lock do SQLite com as transações da sincronização
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.store.read, kind, key, max_age)
+
+    async def _write(self, kind: str, key: str, data: dict):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self.store.write, kind, key, data)
+        except Exception as e:
+            logging.warning(f"Falha ao gravar {kind}={key} na réplica de topologia: {e}")
+
+    async def sync_once(self) -> int:
+        base_url = os.environ.get('N2BOT_CTO_URL')
+        header = {"Token": os.environ.get('N2BOT_CTO_TOKEN')}
+        synced = 0
+        loop = asyncio.get_running_loop()
+        for kind in ("box", "client"):
+            stale = await loop.run_in_executor(self._executor, self.store.stalest, kind, self.sync_interval, self.sync_batch)
+            for key in stale:
+                data = await self.req.get(f"{base_url}{PATHS[kind]}{key}", headers=header, timeout=60, slow_after=60)
+                if payload_ok(data):
+                    await self._write(kind, key, data)
+                    synced += 1
+                elif kind == "box" and data.get("status_code") == 400:
+                    # "Caixa não encontrado": a box foi removida da rede
+                    await loop.run_in_executor(self._executor, self.store.forget_box, key)
+                    logging.info(f"Réplica de topologia: box {key} removida (não existe mais na API de CTO).")
+                    synced += 1
+        return synced
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                synced = await self.sync_once()
+                if synced:
+                    logging.info(f"Réplica de topologia: {synced} registros sincronizados.")
+            except Exception as e:
+                logging.warning(f"Falha na sincronização da réplica de topologia: {e}")
+
+    async def start(self):
+        path = os.environ.get('N2BOT_TOPOLOGY_DB')
+        if not path or self.enabled:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="n2bot-topology")
+        self.store = TopologyStore(path)
+        logging.info(f"Réplica de topologia ativa em {path}: {self.store.counts()}")
+        self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_served": self.stale_served,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+replica = TopologyReplica()
+
+
+def _collect_replica():
+    stats = replica.stats()
+    return [snapshot(Counter, "n2bot_topology_replica_total", "Leituras da réplica de topologia por resultado.",
+                     {("hit",): stats["hits"], ("miss",): stats["misses"], ("stale",): stats["stale_served"]}, ("result",))]
+
+
+registry.add_collector(_collect_replica)
@@ -1,23 +1,45 @@
 import asyncio
+import functools
 import logging
 import os
 import re
+import time
 from warnings import filterwarnings
 
 import nest_asyncio
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import Forbidden
 from telegram.ext import (Application, ApplicationBuilder,
-                          CallbackQueryHandler, CommandHandler, ContextTypes)
+                          CallbackQueryHandler, CommandHandler, ContextTypes,
+                          InlineQueryHandler)
 from telegram.warnings import PTBUserWarning
 
 import config_loader as config
+import db_auth.db_connector as dbc
 import db_auth.users_auth as auth
 import funcs.clients as clis
 import funcs.cpe as cpes
 import funcs.cto as ctos
 import funcs.cto_full as ctfs
+import funcs.cto_prefetch as ctp
+import funcs.inline_search as inl
 import funcs.sobreaviso as sobre
+import funcs.topology as topo
+import utils.adaptive_limit as adaptive
+import utils.audit as audit
+import utils.cache as cache
+import utils.deadline as deadline
+import utils.fetch_context as fctx
+import utils.loop_watchdog as loop_watchdog
 import utils.messages as msgs
+import utils.metrics as metrics
+import utils.outbound as outbound
+import utils.requests as reqs
+import utils.retry as retry
+import utils.scheduler as scheduler
+import utils.update_processor as upd
+import utils.warm_snapshot as warm
+import utils.webhook as webhook
 
 filterwarnings(action="ignore", message=r".*CallbackQueryHandler", category=PTBUserWarning)
 
@@ -37,13 +59,77 @@ nest_asyncio.apply()
 # Inicializações
 loader = config.LoaderInit()
 loader.loader()
+cache.box_cache.configure(
+    maxsize=int(os.environ['N2BOT_BOX_CACHE_SIZE']),
+    ttl=float(os.environ['N2BOT_BOX_CACHE_TTL']),
+)
+cache.box_name_cache.configure(ttl=float(os.environ['N2BOT_BOX_NAME_CACHE_TTL']))
+retry.retry_budget.configure(
+    ratio=float(os.environ['N2BOT_RETRY_BUDGET_RATIO']),
+    max_tokens=float(os.environ['N2BOT_RETRY_BUDGET_MAX']),
+)
+scheduler.scheduler.configure(
+    max_concurrency=int(os.environ['N2BOT_SCHED_MAX_CONCURRENCY']),
+    upstream_limits=scheduler.parse_limits(os.environ['N2BOT_SCHED_UPSTREAM_LIMITS']),
+)
+if os.environ['N2BOT_ACS_ADAPTIVE'] == '1':
+    # O limite fixo do cpestatus continua valendo como piso
+    adaptive.adaptive_limits["cpestatus"] = adaptive.AdaptiveLimit.from_env(
+        "cpestatus", floor=scheduler.scheduler.upstream_limits.get("cpestatus"))
+    scheduler.scheduler.set_adaptive_limit("cpestatus", adaptive.adaptive_limits["cpestatus"])
 cli = clis.ClientStatus()
 cpe = cpes.CpeStatus()
 cto = ctos.CtoData()
 ctf = ctfs.CtoFull()
+ctp.prefetcher = ctp.CtoPrefetcher(ctf)
+inl.inline_search = inl.InlineSearch()
+sob = sobre.Sobreaviso()
+warm.warm_snapshot.register("authorized_users", auth.authorized_users.dump, auth.authorized_users.load)
+warm.warm_snapshot.register("sobreaviso", sob.dump, sob.load)
+warm.warm_snapshot.register("box_cache", cache.box_cache.dump, cache.box_cache.load)
+warm.warm_snapshot.register("box_names", cache.box_name_cache.dump, cache.box_name_cache.load)
 
 cto_regex = "([A-Z]{2,4}-A[0-9]{3}-CTO[1-9]{1,3}|[A-Z]{2,4}_A[0-9]{3}_CD[0-9]{1,2}_(C[1-9]{1,2})-(A[0-9]{1,3}|T[0-9]{1,3}|D[0-9]{1,2})-(T[0-9]{1,3}|T[0-9]{1,3}-FTTA_(.*))_CTO[1-9]{1,3}|[A-Z]{2,4}_A[0-9]{3}_CTO[1-9]{1,3})"
 
+def with_deadline(handler_func):
+    """Aplica o prazo total do comando a todas as chamadas feitas pelo handler e identifica o usuário no escalonador."""
+    @functools.wraps(handler_func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        with deadline.deadline_scope(float(os.environ.get('N2BOT_COMMAND_DEADLINE', 30))), \
+                scheduler.user_scope(user.id if user else None):
+            return await handler_func(update, context)
+    return wrapper
+
+def with_metrics(name: str, handler_func):
+    """Registra duração e concorrência do handler em /metrics."""
+    @functools.wraps(handler_func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        with metrics.commands_in_flight.track(command=name), metrics.command_latency.time(command=name):
+            return await handler_func(update, context)
+    return wrapper
+
+def with_audit(name: str, handler_func):
+    """Envia um evento de auditoria por comando, sem esperar pela gravação."""
+    @functools.wraps(handler_func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        start_time, outcome = time.monotonic(), "ok"
+        with audit.command_scope() as upstream_errors:
+            try:
+                return await handler_func(update, context)
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                if outcome == "ok" and upstream_errors:
+                    outcome = "upstream_error"
+                user, chat = update.effective_user, update.effective_chat
+                audit.audit_log.record(
+                    name, user.id if user else None, chat.id if chat else None, getattr(context, "args", None),
+                    time.monotonic() - start_time, outcome, upstream_errors,
+                )
+    return wrapper
+
 async def denied(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
     msg = msgs.BotMessage(user)
@@ -52,7 +138,7 @@ async def denied(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def is_user_authorized(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     user_id = update.effective_user.id
-    if not auth.authorized_user(user_id):
+    if not await auth.authorized_user(user_id):
         await denied(update, context)
         return False
     return True
@@ -77,31 +163,20 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 async def help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     if not await is_user_authorized(update, context):
         return
-    
-    wait_message = await update.effective_message.reply_text(
-        text="⏳ Processando sua solicitação, aguarde...",
-        parse_mode="HTML"
-    )
 
-    user = update.effective_user
-    bot_messege = msgs.BotMessage(user)
-    message = bot_messege.help_message()
+    async with outbound.progress(update.effective_message) as reply:
+        user = update.effective_user
+        bot_messege = msgs.BotMessage(user)
+        message = bot_messege.help_message()
 
-    await wait_message.delete()
-    await update.effective_message.reply_text(message, parse_mode="HTML")
+        await reply.edit_text(message, parse_mode="HTML")
 
 async def sobreaviso(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    wait_message = await update.effective_message.reply_text(
-        text="⏳ Processando sua solicitação, aguarde...",
-        parse_mode="HTML"
-    )
-
-    user = update.effective_user
-    sob = sobre.Sobreaviso()
-    message = await sob.sobreaviso_ope(user)
+    async with outbound.progress(update.effective_message) as reply:
+        user = update.effective_user
+        message = await sob.sobreaviso_ope(user)
 
-    await wait_message.delete()
-    await update.effective_message.reply_text(message, parse_mode="HTML")
+        await reply.edit_text(message, parse_mode="HTML")
 
 async def client(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not await is_user_authorized(update, context):
@@ -111,17 +186,12 @@ async def client(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.effective_message.reply_text("❗ Você precisa fornecer o código do cliente.")
         return
     
-    wait_message = await update.effective_message.reply_text(
-        text="⏳ Processando sua solicitação, aguarde...",
-        parse_mode="HTML"
-    )
-
-    user = update.effective_user
-    cliente_id = context.args[0]
-    message = await cli.get_client_status(cliente_id, user)
+    async with outbound.progress(update.effective_message) as reply:
+        user = update.effective_user
+        cliente_id = context.args[0]
+        message = await cli.get_client_status(cliente_id, user)
 
-    await wait_message.delete()
-    await update.effective_message.reply_text(message, parse_mode="HTML")
+        await reply.edit_text(message, parse_mode="HTML")
 
 async def cpestatus(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not await is_user_authorized(update, context):
@@ -131,17 +201,12 @@ async def cpestatus(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.effective_message.reply_text("❗ Você precisa fornecer o código do cliente.")
         return
     
-    wait_message = await update.effective_message.reply_text(
-        text="⏳ Processando sua solicitação, aguarde...",
-        parse_mode="HTML"
-    )
-
-    user = update.effective_user
-    client_id = context.args[0]
-    mensagem = await cpe.get_cep_status(client_id, user)
+    async with outbound.progress(update.effective_message) as reply:
+        user = update.effective_user
+        client_id = context.args[0]
+        mensagem = await cpe.get_cep_status(client_id, user)
 
-    await wait_message.delete()
-    await update.effective_message.reply_text(mensagem, parse_mode="HTML")
+        await reply.edit_text(mensagem, parse_mode="HTML")
 
 async def cto_data(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not await is_user_authorized(update, context):
@@ -151,68 +216,151 @@ async def cto_data(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.effective_message.reply_text("❗ Você precisa fornecer o código do cliente ou o nome da CTO.")
         return
 
-    wait_message = await update.effective_message.reply_text("⏳ Processando sua solicitação, aguarde...")
-
-    try:
-        user = update.effective_user
-        first_arg = context.args[0]
-        msg_handler = msgs.BotMessage(user)
-        if re.match(cto_regex, first_arg, re.IGNORECASE):
-            box_id = await cto.get_name_boxid(context)
-            if not box_id:
-                await wait_message.edit_text("❗ CTO não encontrada na base de dados.")
-                return
-            result = await ctf.get_cto_data_by_box(box_id)
-            if isinstance(result, str):
-                await wait_message.edit_text(result, parse_mode="HTML")
-                return
-            cpe_status = await ctf.get_status_box(box_id, result.get("points", []))
-            mensagem = msg_handler.build_message_cto(result, cpe_status)
-            await wait_message.edit_text(mensagem, parse_mode="HTML")
+    async with outbound.progress(update.effective_message) as wait_message:
+        fetch_ctx = fctx.FetchContext("cto")
+
+        try:
+            user = update.effective_user
+            first_arg = context.args[0]
+            msg_handler = msgs.BotMessage(user)
+            if re.match(cto_regex, first_arg, re.IGNORECASE):
+                box_id = await cto.get_name_boxid(context, fetch_ctx=fetch_ctx)
+                if not box_id:
+                    await wait_message.edit_text("❗ CTO não encontrada na base de dados.")
+                    return
+                result = await ctf.get_cto_data_by_box(box_id, fetch_ctx=fetch_ctx)
+                if isinstance(result, str):
+                    await wait_message.edit_text(result, parse_mode="HTML")
+                    return
+                await render_cto_box(wait_message, msg_handler, box_id, result, fetch_ctx)
+            else:
+                client_id = first_arg
+                service_hsi = context.args[1] if len(context.args) > 1 else None
+                result = await cto.process_check(client_id, service_hsi, user, fetch_ctx=fetch_ctx)
+                reply_markup = None
+                if "reply_markup" in result and result.get("reply_markup"):
+                    keyboard_layout = result["reply_markup"].get("inline_keyboard", [])
+                    if keyboard_layout:
+                        keyboard = [
+                            [InlineKeyboardButton(btn["text"], callback_data=btn["callback_data"]) for btn in row]
+                            for row in keyboard_layout
+                        ]
+                        reply_markup = InlineKeyboardMarkup(keyboard)
+                        # O técnico costuma tocar em "Ver Detalhes da CTO" logo em seguida
+                        for row in keyboard_layout:
+                            for btn in row:
+                                if btn["callback_data"].startswith("cto_full_"):
+                                    ctp.prefetcher.offer(btn["callback_data"].split("_")[2])
+
+                await wait_message.edit_text(
+                    text=result.get("message", "Ocorreu um erro inesperado."),
+                    reply_markup=reply_markup,
+                    parse_mode="HTML"
+                )
+
+        except Exception as e:
+            logging.error(f"Erro na função cto_data: {e}", exc_info=True)
+            await wait_message.edit_text(f"❌ Ocorreu um erro ao processar sua solicitação: {e}")
+        finally:
+            fetch_ctx.report()
+
+async def edit_parts(sent: list, parts: list) -> None:
+    """Edita as mensagens já enviadas com as novas partes e envia as que faltarem (limite de 4096 caracteres)."""
+    for index, part in enumerate(parts):
+        if index < len(sent):
+            message, last_text = sent[index]
+            if part != last_text:
+                await outbound.edit(message, part, parse_mode="HTML")
+                sent[index][1] = part
         else:
-            client_id = first_arg
-            service_hsi = context.args[1] if len(context.args) > 1 else None
-            result = await cto.process_check(client_id, service_hsi, user)
-            reply_markup = None
-            if "reply_markup" in result and result.get("reply_markup"):
-                keyboard_layout = result["reply_markup"].get("inline_keyboard", [])
-                if keyboard_layout:
-                    keyboard = [
-                        [InlineKeyboardButton(btn["text"], callback_data=btn["callback_data"]) for btn in row]
-                        for row in keyboard_layout
-                    ]
-                    reply_markup = InlineKeyboardMarkup(keyboard)
-
-            await wait_message.edit_text(
-                text=result.get("message", "Ocorreu um erro inesperado."),
-                reply_markup=reply_markup,
-                parse_mode="HTML"
-            )
+            new_message = await sent[0][0].chat.send_message(part, parse_mode="HTML")
+            sent.append([new_message, part])
+
+async def render_cto_box(message, msg_handler: msgs.BotMessage, box_id: str, result: dict, fetch_ctx: fctx.FetchContext) -> None:
+    points = result.get("points", [])
+    sent = [[message, None]]
+    if os.environ.get('N2BOT_CTO_STREAMING', '1') != '1':
+        cpe_status = await ctf.get_status_box(box_id, points, fetch_ctx=fetch_ctx)
+        await edit_parts(sent, msg_handler.build_message_cto_parts(result, cpe_status))
+        return
 
-    except Exception as e:
-        logging.error(f"Erro na função cto_data: {e}", exc_info=True)
-        await wait_message.edit_text(f"❌ Ocorreu um erro ao processar sua solicitação: {e}")
+    # Renderiza a CTO já com as saídas pendentes e preenche conforme as ONTs respondem
+    interval = float(os.environ.get('N2BOT_STREAM_EDIT_INTERVAL', 2))
+    pending = {p.get("attributes", {}).get("cod_cli_active") for p in points} - {None, ""}
+    cpe_status = {}
+    await edit_parts(sent, msg_handler.build_message_cto_parts(result, cpe_status, pending))
+    last_edit = time.monotonic()
+
+    async for res_dict in ctf.iter_status_box(box_id, points, fetch_ctx=fetch_ctx):
+        cpe_status.update(res_dict)
+        pending.difference_update(res_dict)
+        if pending and time.monotonic() - last_edit >= interval:
+            try:
+                # Parciais cedem a vez às respostas finais de outros comandos no limitador da Bot API
+                with outbound.send_priority(outbound.PROGRESS):
+                    await edit_parts(sent, msg_handler.build_message_cto_parts(result, cpe_status, pending))
+            except Exception as e:
+                logging.debug(f"Edição parcial da CTO {box_id} ignorada: {e}")
+            last_edit = time.monotonic()
+
+    await edit_parts(sent, msg_handler.build_message_cto_parts(result, cpe_status))
 
 async def cto_full(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    query_data = update.callback_query.data
+    query = update.callback_query
+    query_data = query.data
     user = update.effective_user
     msg = msgs.BotMessage(user)
+    if not await auth.authorized_user(user.id):
+        # O botão pode chegar a não autorizados por mensagens inline encaminhadas
+        await query.answer(msg.access_denied_alert(), show_alert=True)
+        return
+    message = update.effective_message
+    if message is None:
+        # Botão de um resultado inline: não há mensagem do bot para editar, a CTO vai para o chat privado
+        try:
+            message = await context.bot.send_message(user.id, outbound.WAIT_TEXT)
+        except Forbidden:
+            # O usuário nunca iniciou o bot (ou o bloqueou): o Telegram não deixa o bot escrever primeiro
+            await query.answer(msg.start_bot_alert(context.bot.username), show_alert=True)
+            return
+        await query.answer()
 
     try:
         box_id = query_data.split("_")[2]
     except IndexError:
-        await update.effective_message.reply_text("Erro ao processar ID da CTO a partir do callback.")
+        await message.reply_text("Erro ao processar ID da CTO a partir do callback.")
         return
 
+    fetch_ctx = fctx.FetchContext("cto_full")
     try:
-        result = await ctf.get_cto_data_by_box(box_id)
-        cpe_status = await ctf.get_status_box(box_id, result.get("points", []))
-        mensagem = msg.build_message_cto(result, cpe_status)
-        await update.effective_message.edit_text(mensagem, parse_mode="HTML")
+        result = await ctp.prefetcher.take(box_id)
+        if result is None:
+            result = await ctf.get_cto_data_by_box(box_id, fetch_ctx=fetch_ctx)
+        await render_cto_box(message, msg, box_id, result, fetch_ctx)
         
     except Exception as e:
         logging.error(f"Erro no processo do cto_full: {e}", exc_info=True)
-        await update.effective_message.reply_text(f"Ocorreu um erro ao processar a CTO: {e}")
+        await message.reply_text(f"Ocorreu um erro ao processar a CTO: {e}")
+    finally:
+        fetch_ctx.report()
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.inline_query
+    user = query.from_user
+    if not await auth.authorized_user(user.id):
+        await query.answer([], cache_time=0, is_personal=True)
+        return
+
+    found = await inl.inline_search.search(user.id, query.query)
+    if found is None:
+        # Substituída por uma consulta mais nova do mesmo usuário; o Telegram descarta esta
+        return
+    kind, results = found
+    await query.answer(
+        msgs.BotMessage(user).inline_results(kind, results),
+        cache_time=int(os.environ.get('N2BOT_INLINE_CACHE_TIME', 30)),
+        is_personal=True,
+    )
 
 def get_bot_token() -> str:
     token = os.environ.get('N2BOT_TOKEN')
@@ -231,17 +379,63 @@ def register_handlers(app: Application):
     }
 
     for command, handler_func in command_handlers.items():
-        app.add_handler(CommandHandler(command, handler_func))
-    app.add_handler(CallbackQueryHandler(cto_full, pattern=r"^cto_full_"))
-    app.add_handler(CallbackQueryHandler(button_handler))
+        app.add_handler(CommandHandler(command, with_metrics(command, with_audit(command, with_deadline(handler_func)))))
+    app.add_handler(CallbackQueryHandler(with_metrics("cto_full", with_audit("cto_full", with_deadline(cto_full))), pattern=r"^cto_full_"))
+    app.add_handler(CallbackQueryHandler(with_metrics("button", button_handler)))
+    app.add_handler(InlineQueryHandler(with_metrics("inline", with_deadline(inline_query))))
+
+async def post_init(app: Application) -> None:
+    await loop_watchdog.watchdog.start()
+    await reqs.session_pool.open()
+    await warm.warm_snapshot.restore()
+    try:
+        await dbc.db_pool.open()
+    except Exception:
+        logger.warning("Pool MySQL indisponível na inicialização; nova tentativa na próxima consulta.")
+    await auth.authorized_users.start()
+    await sob.start()
+    await topo.replica.start()
+    await warm.warm_snapshot.start()
+    await audit.audit_log.start()
+    await metrics.metrics_server.start()
+
+async def post_shutdown(app: Application) -> None:
+    await metrics.metrics_server.stop()
+    await warm.warm_snapshot.stop()
+    await auth.authorized_users.stop()
+    await sob.stop()
+    await topo.replica.stop()
+    await ctp.prefetcher.stop()
+    await audit.audit_log.stop()
+    await reqs.session_pool.close()
+    await dbc.db_pool.close()
+    await loop_watchdog.watchdog.stop()
+
+def build_application(token: str) -> Application:
+    builder = (
+        ApplicationBuilder()
+        .token(token)
+        .concurrent_updates(upd.build_update_processor(int(os.environ['N2BOT_CONCURRENT_UPDATES'])))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if os.environ.get('N2BOT_TELEGRAM_RATE_LIMIT', '1') == '1':
+        builder = builder.rate_limiter(outbound.FloodRateLimiter.from_env())
+    if os.environ.get('N2BOT_API_BASE_URL'):
+        builder = builder.base_url(os.environ['N2BOT_API_BASE_URL'])
+    app = builder.build()
+    register_handlers(app)
+    return app
 
 async def main() -> None:
     try:
-        token = get_bot_token()
-        app = ApplicationBuilder().token(token).build()
-        register_handlers(app)
-        logger.info("Bot iniciando...")
-        await app.run_polling()
+        app = build_application(get_bot_token())
+        mode = os.environ.get('N2BOT_BOT_MODE', 'polling')
+        logger.info(f"Bot iniciando em modo {mode}...")
+        if mode == 'webhook':
+            await webhook.run_webhook(app)
+        else:
+            await app.run_polling()
 
     except Exception as e:
         logger.error(f"Erro inesperado ao executar o bot: {e}", exc_info=True)
@@ -0,0 +1,118 @@
+import os
+import time
+from collections import deque
+
+from utils.metrics import Counter, Gauge, registry, snapshot
+
+
+class AdaptiveLimit:
+    """Limite de concorrência AIMD guiado por latência e erros.
+
+    Cresce +1 a cada `limit` respostas boas enquanto está sendo usado; cai multiplicativamente (no máximo uma
+    vez por tempo de resposta) quando há erro ou quando o percentil `quantile` das últimas `recent` respostas
+    passa de `tolerance` vezes a latência base.
+
+    A base é o mesmo percentil das últimas `window` respostas bem-sucedidas com até `reference` chamadas
+    simultâneas (uma concorrência sabidamente segura, como o antigo limite fixo). Falhas rápidas não entram
+    nela, e amostras feitas acima da referência também não: medida sob a própria carga que o limite libera,
+    a base subiria junto com ele. Comparar percentis baixos tolera latência bimodal (30% rápidas, 70% lentas),
+    já que a fila no upstream atrasa também as respostas rápidas.
+    """
+
+    def __init__(self, name: str, initial: float = 8, minimum: int = 2, maximum: int = 64,
+                 tolerance: float = 2.0, backoff: float = 0.7, window: int = 200, recent: int = 50,
+                 quantile: float = 0.1, reference: int = None):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self._limit = float(initial)
+        self.quantile = quantile
+        self.reference = max(minimum, int(initial)) if reference is None else reference
+        self._samples = deque(maxlen=window)
+        self._recent = deque(maxlen=recent)
+        self._smoothed = None
+        self._last_decrease = 0.0
+        self.increases = 0
+        self.decreases = 0
+
+    @classmethod
+    def from_env(cls, name: str, floor: int = None) -> "AdaptiveLimit":
+        """`floor` é o limite fixo que o adaptativo substitui: vira o mínimo e a concorrência de referência."""
+        initial = float(os.environ.get('N2BOT_ACS_LIMIT_INITIAL', 8))
+        minimum = int(os.environ.get('N2BOT_ACS_LIMIT_MIN', 2))
+        if floor:
+            minimum, initial = max(minimum, floor), max(initial, floor)
+        return cls(
+            name,
+            initial=initial,
+            minimum=minimum,
+            maximum=int(os.environ.get('N2BOT_ACS_LIMIT_MAX', 64)),
+            tolerance=float(os.environ.get('N2BOT_ACS_LIMIT_TOLERANCE', 2.0)),
+            backoff=float(os.environ.get('N2BOT_ACS_LIMIT_BACKOFF', 0.7)),
+        )
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _percentile(self, samples) -> float:
+        ordered = sorted(samples)
+        return ordered[int(self.quantile * (len(ordered) - 1))]
+
+    @property
+    def baseline(self):
+        return self._percentile(self._samples) if self._samples else None
+
+    def record(self, latency: float, success: bool, in_flight: int):
+        self._smoothed = latency if self._smoothed is None else 0.8 * self._smoothed + 0.2 * latency
+        if success:
+            self._recent.append(latency)
+            if in_flight <= self.reference:
+                self._samples.append(latency)
+        # Sem base ou com a janela recente ainda incompleta, só erros contam como congestionamento
+        judged = self._samples and len(self._recent) == self._recent.maxlen
+        congested = not success or (judged and self._percentile(self._recent) > self.tolerance * self.baseline)
+        now = time.monotonic()
+        if congested:
+            # Um corte por "volta": as respostas da mesma rajada lenta não derrubam o limite em cascata
+            if now - self._last_decrease >= self._smoothed:
+                self._limit = max(self.minimum, self._limit * self.backoff)
+                self._last_decrease = now
+                self.decreases += 1
+        elif in_flight >= self.limit // 2 and self._limit < self.maximum:
+            # Só cresce quando o limite está de fato sendo usado
+            previous = self.limit
+            self._limit = min(self.maximum, self._limit + 1 / self._limit)
+            if self.limit > previous:
+                self.increases += 1
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "baseline": self.baseline or 0.0,
+            "smoothed": self._smoothed or 0.0,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+
+adaptive_limits = {}
+
+
+def _collect_adaptive_limits():
+    stats = {name: limiter.stats() for name, limiter in adaptive_limits.items()}
+    return [
+        snapshot(Gauge, "n2bot_adaptive_limit", "Concorrência permitida pelo limite adaptativo.",
+                 {(name,): s["limit"] for name, s in stats.items()}, ("upstream",)),
+        snapshot(Gauge, "n2bot_adaptive_limit_latency_seconds", "Latência base e suavizada vistas pelo limite adaptativo.",
+                 {(name, kind): s[kind] for name, s in stats.items() for kind in ("baseline", "smoothed")},
+                 ("upstream", "kind")),
+        snapshot(Counter, "n2bot_adaptive_limit_changes_total", "Ajustes do limite adaptativo.",
+                 {(name, direction): s[direction] for name, s in stats.items() for direction in ("increases", "decreases")},
+                 ("upstream", "direction")),
+    ]
+
+
+registry.add_collector(_collect_adaptive_limits)
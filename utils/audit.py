@@ -0,0 +1,195 @@
+"""Auditoria de comandos: eventos compactos numa fila limitada, gravados em lote por uma tarefa em segundo plano.
+
+Tabela esperada quando o destino é MySQL:
+
+    CREATE TABLE n2bot_audit (
+        ts DATETIME(3) NOT NULL,
+        command VARCHAR(32) NOT NULL,
+        user_id BIGINT,
+        chat_id BIGINT,
+        args VARCHAR(128),
+        duration_ms INT NOT NULL,
+        outcome VARCHAR(16) NOT NULL,
+        upstream_errors VARCHAR(255),
+        KEY idx_audit_ts (ts)
+    );
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from db_auth.db_connector import db_pool
+from utils.metrics import Counter, Gauge, registry, snapshot
+
+COLUMNS = ("ts", "command", "user_id", "chat_id", "args", "duration_ms", "outcome", "upstream_errors")
+
+_upstream_errors = contextvars.ContextVar("n2bot_audit_upstream_errors", default=None)
+
+
+@contextmanager
+def command_scope():
+    """Coleta os upstreams que falharam durante o comando (inclusive em tarefas filhas, que herdam o contexto)."""
+    errors = set()
+    token = _upstream_errors.set(errors)
+    try:
+        yield errors
+    finally:
+        _upstream_errors.reset(token)
+
+
+def note_upstream_error(upstream: str):
+    errors = _upstream_errors.get()
+    if errors is not None:
+        errors.add(upstream)
+
+
+class AuditLog:
+    """Fila limitada com contadores de descarte: registrar um evento nunca espera nem bloqueia o comando."""
+
+    def __init__(self):
+        self._queue = None
+        self._task = None
+        self._file_logger = None
+        self._wakeup = None
+        self._stopping = False
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+
+    @property
+    def sink(self) -> str:
+        return os.environ.get('N2BOT_AUDIT_SINK', '')
+
+    @property
+    def batch_size(self) -> int:
+        return int(os.environ.get('N2BOT_AUDIT_BATCH_SIZE', 100))
+
+    @property
+    def flush_interval(self) -> float:
+        return float(os.environ.get('N2BOT_AUDIT_FLUSH_INTERVAL', 2))
+
+    @property
+    def table(self) -> str:
+        return os.environ.get('N2BOT_AUDIT_TABLE', 'n2bot_audit')
+
+    def record(self, command: str, user_id, chat_id, args: list, duration: float, outcome: str, upstream_errors=()):
+        if self._queue is None:
+            return
+        event = (
+            datetime.now().isoformat(sep=" ", timespec="milliseconds"),
+            command,
+            user_id,
+            chat_id,
+            " ".join(args or [])[:128],
+            int(duration * 1000),
+            outcome,
+            ",".join(sorted(upstream_errors))[:255],
+        )
+        try:
+            self._queue.put_nowait(event)
+            self.recorded += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def _build_file_logger(self) -> logging.Logger:
+        file_logger = logging.getLogger("n2bot.audit")
+        file_logger.propagate = False
+        file_logger.setLevel(logging.INFO)
+        file_logger.handlers.clear()
+        file_logger.addHandler(RotatingFileHandler(
+            os.environ.get('N2BOT_AUDIT_FILE', 'audit.log'),
+            maxBytes=int(os.environ.get('N2BOT_AUDIT_MAX_BYTES', 10 * 1024 * 1024)),
+            backupCount=int(os.environ.get('N2BOT_AUDIT_BACKUPS', 5)),
+            encoding="utf-8",
+        ))
+        return file_logger
+
+    def _write_file(self, batch: list):
+        for event in batch:
+            self._file_logger.info(json.dumps(dict(zip(COLUMNS, event)), ensure_ascii=False))
+
+    async def _write_batch(self, batch: list):
+        try:
+            if self.sink == "mysql":
+                placeholders = ", ".join(["%s"] * len(COLUMNS))
+                # O conector transforma o executemany de INSERT em um único INSERT com várias linhas
+                await db_pool.executemany(
+                    f"INSERT INTO {self.table} ({', '.join(COLUMNS)}) VALUES ({placeholders})", batch
+                )
+            else:
+                await asyncio.get_running_loop().run_in_executor(None, self._write_file, batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.write_errors += len(batch)
+            logging.warning(f"Falha ao gravar {len(batch)} eventos de auditoria: {e}")
+
+    def _drain(self) -> list:
+        batch = []
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _writer(self):
+        # Grava a cada flush_interval, ou antes se um lote completo se formar; no desligamento esvazia a fila
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while not self._queue.empty():
+                await self._write_batch(self._drain())
+            if self._stopping:
+                return
+
+    async def start(self):
+        if self.sink not in ("file", "mysql") or self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=int(os.environ.get('N2BOT_AUDIT_QUEUE_SIZE', 1000)))
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        if self.sink == "file":
+            self._file_logger = self._build_file_logger()
+        self._task = asyncio.create_task(self._writer())
+        logging.info(f"Auditoria de comandos ativa (destino: {self.sink}).")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        self._queue = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "written": self.written,
+            "write_errors": self.write_errors,
+        }
+
+
+audit_log = AuditLog()
+
+
+def _collect_audit():
+    stats = audit_log.stats()
+    return [
+        snapshot(Counter, "n2bot_audit_events_total", "Eventos de auditoria por destino final.",
+                 {(name,): stats[name] for name in ("recorded", "dropped", "written", "write_errors")}, ("result",)),
+        snapshot(Gauge, "n2bot_audit_queue_depth", "Eventos de auditoria aguardando gravação.", {(): stats["queued"]}),
+    ]
+
+
+registry.add_collector(_collect_audit)
@@ -0,0 +1,118 @@
+import time
+from collections import OrderedDict
+
+from utils.metrics import Counter, Gauge, registry, snapshot
+
+
+class TTLCache:
+    """Cache LRU limitado por tamanho, com expiração por TTL e contadores de acerto."""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, maxsize: int = None, ttl: float = None):
+        if maxsize is not None:
+            self.maxsize = maxsize
+        if ttl is not None:
+            self.ttl = ttl
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[1] > time.monotonic()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float = None):
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key) -> bool:
+        return self._data.pop(key, None) is not None
+
+    def clear(self):
+        self._data.clear()
+
+    async def get_or_fetch(self, key, fetch, cacheable=None):
+        """Leitura com preenchimento: em caso de falta, aguarda `fetch()` e guarda o valor se `cacheable(valor)`."""
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = await fetch()
+        if cacheable is None or cacheable(value):
+            self.set(key, value)
+        return value
+
+    def dump(self) -> list:
+        """Entradas válidas como [chave, valor, expiração em epoch], da menos à mais recente (para snapshot em disco)."""
+        now, wall = time.monotonic(), time.time()
+        return [[key, value, wall + expires_at - now] for key, (value, expires_at) in self._data.items() if expires_at > now]
+
+    def load(self, entries: list) -> int:
+        """Recarrega entradas de `dump`, respeitando o TTL que restava a cada uma."""
+        loaded, wall = 0, time.time()
+        for key, value, expires_wall in entries:
+            remaining = min(expires_wall - wall, self.ttl)
+            if remaining > 0 and key not in self:
+                self.set(key, value, ttl=remaining)
+                loaded += 1
+        return loaded
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+# Payloads de /getbox compartilhados entre CtoData e CtoFull
+box_cache = TTLCache(maxsize=256, ttl=120)
+# Nome da CTO (minúsculo) -> box_id, resolvido por /searchbox
+box_name_cache = TTLCache(maxsize=2048, ttl=3600)
+# Consulta inline normalizada -> (resultados, lista completa?), usada também para prefixos mais longos
+inline_search_cache = TTLCache(maxsize=512, ttl=300)
+
+
+def _collect_box_cache():
+    stats = box_cache.stats()
+    return [
+        snapshot(Counter, "n2bot_box_cache_total", "Consultas ao cache de /getbox por resultado.",
+                 {("hit",): stats["hits"], ("miss",): stats["misses"]}, ("result",)),
+        snapshot(Counter, "n2bot_box_cache_evictions_total", "Entradas removidas do cache de /getbox.",
+                 {(): stats["evictions"]}),
+        snapshot(Gauge, "n2bot_box_cache_entries", "Entradas no cache de /getbox.", {(): stats["size"]}),
+    ]
+
+
+registry.add_collector(_collect_box_cache)
+
+
+def box_payload_ok(data) -> bool:
+    return isinstance(data, dict) and not data.get("error") and not data.get("status_code") and bool(data.get("result"))
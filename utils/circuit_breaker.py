@@ -0,0 +1,130 @@
+import logging
+import os
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Upstreams configurados, cada um com o seu próprio disjuntor
+UPSTREAM_ENVS = {
+    "clistatus": "N2BOT_CLISTATUS_URL",
+    "cpestatus": "N2BOT_CPESTATUS_URL",
+    "cto": "N2BOT_CTO_URL",
+    "sobreaviso": "N2BOT_SOBREAVISO_URL",
+}
+
+
+class CircuitBreaker:
+    """Disjuntor por upstream: abre com falhas ou lentidão, falha rápido e testa a recuperação em meia-abertura."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self.rejected = 0
+        self.opened_count = 0
+        self._outcomes = deque(maxlen=self.window)
+        self._probes = 0
+        self._probe_started = 0.0
+
+    @property
+    def failure_threshold(self) -> int:
+        return int(os.environ.get('N2BOT_BREAKER_FAILURE_THRESHOLD', 5))
+
+    @property
+    def failure_rate(self) -> float:
+        return float(os.environ.get('N2BOT_BREAKER_FAILURE_RATE', 0.5))
+
+    @property
+    def window(self) -> int:
+        return int(os.environ.get('N2BOT_BREAKER_WINDOW', 20))
+
+    @property
+    def slow_call_seconds(self) -> float:
+        return float(os.environ.get('N2BOT_BREAKER_SLOW_CALL', 10))
+
+    @property
+    def open_seconds(self) -> float:
+        return float(os.environ.get('N2BOT_BREAKER_OPEN_SECONDS', 30))
+
+    def _transition(self, state: str):
+        if state != self.state:
+            logging.warning(f"Disjuntor do upstream '{self.name}': {self.state} -> {state}")
+            self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            self.opened_count += 1
+        self._probes = 0
+
+    def allow(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        if self.state == CLOSED:
+            return True
+        # Uma sonda por vez; se ela se perder (ex.: cancelada), outra é liberada após open_seconds
+        if self.state == HALF_OPEN and (self._probes == 0 or time.monotonic() - self._probe_started >= self.open_seconds):
+            self._probes += 1
+            self._probe_started = time.monotonic()
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, success: bool, latency: float = 0.0, slow_after: float = None):
+        # `slow_after` é o limite de lentidão da própria chamada (ex.: /getbox, feito com timeout de 60s)
+        failed = not success or latency > (self.slow_call_seconds if slow_after is None else slow_after)
+        if self.state == HALF_OPEN:
+            if failed:
+                self._transition(OPEN)
+            else:
+                self._outcomes.clear()
+                self.consecutive_failures = 0
+                self._transition(CLOSED)
+            return
+
+        self._outcomes.append(failed)
+        self.consecutive_failures = self.consecutive_failures + 1 if failed else 0
+        if self.state != CLOSED:
+            return
+        failures = sum(self._outcomes)
+        rate_tripped = len(self._outcomes) >= self._outcomes.maxlen // 2 and failures / len(self._outcomes) >= self.failure_rate
+        if self.consecutive_failures >= self.failure_threshold or rate_tripped:
+            self._transition(OPEN)
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "window_failures": sum(self._outcomes),
+            "window_size": len(self._outcomes),
+            "opened_count": self.opened_count,
+            "rejected": self.rejected,
+        }
+
+
+class BreakerRegistry:
+    def __init__(self):
+        self._breakers = {}
+
+    def _name_for(self, url: str) -> str:
+        for name, env in UPSTREAM_ENVS.items():
+            base_url = os.environ.get(env)
+            if base_url and url.startswith(base_url):
+                return name
+        return urlsplit(url).netloc
+
+    def for_url(self, url: str) -> CircuitBreaker:
+        name = self._name_for(url)
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name)
+        return breaker
+
+    def snapshot(self) -> dict:
+        return {name: breaker.snapshot() for name, breaker in self._breakers.items()}
+
+
+breakers = BreakerRegistry()
@@ -0,0 +1,42 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+_deadline = contextvars.ContextVar("n2bot_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """Define um prazo absoluto para todas as chamadas aninhadas (e tarefas criadas dentro dele)."""
+    current = _deadline.get()
+    expires_at = time.monotonic() + seconds
+    if current is not None:
+        expires_at = min(expires_at, current)
+    token = _deadline.set(expires_at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Segundos restantes do prazo atual, ou None quando não há prazo definido."""
+    expires_at = _deadline.get()
+    if expires_at is None:
+        return None
+    return expires_at - time.monotonic()
+
+
+def expires_at():
+    """Instante monotônico em que o prazo atual vence, ou None quando não há prazo definido."""
+    return _deadline.get()
+
+
+@contextmanager
+def detached_scope(seconds: float):
+    """Define um prazo novo, ignorando o atual (trabalho em segundo plano que pode sobreviver ao comando)."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
@@ -0,0 +1,47 @@
+import asyncio
+import logging
+
+from utils.metrics import Counter, registry, snapshot
+
+fetch_totals = {"fetched": 0, "saved": 0}
+
+
+def _collect_fetch_totals():
+    return [snapshot(Counter, "n2bot_fetch_context_total", "Buscas por interação: feitas ao upstream ou reaproveitadas.",
+                     {("fetched",): fetch_totals["fetched"], ("saved",): fetch_totals["saved"]}, ("result",))]
+
+
+registry.add_collector(_collect_fetch_totals)
+
+
+class FetchContext:
+    """Memoiza os payloads buscados durante uma única interação (comando ou callback)."""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self._entries = {}
+        self.fetched = 0
+        self.saved = 0
+
+    async def get(self, req, url, headers=None, **kwargs):
+        key = (url, tuple(sorted((headers or {}).items())))
+        task = self._entries.get(key)
+        if task is None:
+            self.fetched += 1
+            fetch_totals["fetched"] += 1
+            task = asyncio.ensure_future(req.get(url, headers=headers, **kwargs))
+            self._entries[key] = task
+        else:
+            self.saved += 1
+            fetch_totals["saved"] += 1
+        return await asyncio.shield(task)
+
+    def cancel(self):
+        """Cancela as buscas ainda em andamento (o `shield` em `get` as mantém vivas sem isso)."""
+        for task in self._entries.values():
+            if not task.done():
+                task.cancel()
+
+    def report(self):
+        if self.saved:
+            logging.info(f"{self.label}: {self.fetched} chamadas ao upstream, {self.saved} evitadas pelo contexto da interação")
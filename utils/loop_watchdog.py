@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from utils.metrics import Counter, Gauge, registry, snapshot
+
+loop_lag = registry.histogram(
+    "n2bot_event_loop_lag_seconds", "Atraso de agendamento do event loop.",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5))
+
+
+class LoopWatchdog:
+    """Mede o atraso do event loop com um heartbeat e, por uma thread à parte, registra a pilha de quem o bloqueia."""
+
+    def __init__(self, samples: int = 1024):
+        self._lags = deque(maxlen=samples)
+        self._last_beat = 0.0
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._reported_beat = None
+        self.stalls = 0
+
+    @property
+    def interval(self) -> float:
+        return float(os.environ.get('N2BOT_LOOP_WATCHDOG_INTERVAL', 0.1))
+
+    @property
+    def threshold(self) -> float:
+        return float(os.environ.get('N2BOT_LOOP_BLOCK_THRESHOLD', 0.5))
+
+    async def _heartbeat(self):
+        interval = self.interval
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._last_beat = now
+            self._lags.append(lag)
+            loop_lag.observe(lag)
+            if lag >= self.threshold:
+                logging.warning(f"Event loop ficou bloqueado por {lag:.3f}s.")
+
+    def _monitor(self):
+        while not self._stop.wait(self.interval):
+            beat = self._last_beat
+            if not beat or beat == self._reported_beat or time.monotonic() - beat < self.interval + self.threshold:
+                continue
+            # Uma pilha por bloqueio: o mesmo heartbeat atrasado não é registrado de novo
+            self._reported_beat = beat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "(pilha indisponível)\n"
+            logging.warning(
+                f"Event loop sem responder há {time.monotonic() - beat:.3f}s; pilha atual da thread do loop:\n{stack}"
+            )
+
+    def percentiles(self) -> dict:
+        ordered = sorted(self._lags)
+        if not ordered:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+
+        def pick(pct: float) -> float:
+            return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+        return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": ordered[-1]}
+
+    async def start(self):
+        if self.threshold <= 0 or self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._monitor, name="n2bot-loop-watchdog", daemon=True)
+        self._thread.start()
+        logging.info(f"Watchdog do event loop ativo (limite de {self.threshold:.2f}s).")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
+watchdog = LoopWatchdog()
+
+
+def _collect_loop_lag():
+    values = watchdog.percentiles()
+    return [
+        snapshot(Gauge, "n2bot_event_loop_lag_quantile_seconds", "Percentis do atraso do event loop (últimas amostras).",
+                 {(name,): value for name, value in values.items()}, ("quantile",)),
+        snapshot(Counter, "n2bot_event_loop_stalls_total", "Bloqueios do event loop acima do limite.", {(): watchdog.stalls}),
+    ]
+
+
+registry.add_collector(_collect_loop_lag)
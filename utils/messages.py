@@ -1,24 +1,135 @@
-import textwrap
-
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, User
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent, User
 
 import utils.convert_funcs as cfs
+from utils.templates import Template, split_message
 
 cf = cfs.ConvertFuncs()
 
+CTO_SEPARATOR = "— — — — — — — — — — — — —\n\n"
+
+WELCOME = Template("""\
+    👋 Olá, <b>{first_name}</b>!
+
+    Bem-vindo(a) ao Assistente Virtual da Certto para o time N2.
+    Seu acesso foi verificado com sucesso. ✅
+
+    Estou aqui para simplificar suas tarefas operacionais do dia a dia.
+""")
+
+ACCESS_DENIED = Template(
+    "<b>🚫 Acesso negado, {first_name}.</b>\n\n"
+    "⚠️ Seu ID do Telegram não foi encontrado na lista de usuários autorizados.\n"
+    "ℹ️ Se achar que se trata de um erro, contate o setor de Operações.",
+    dedent=False,
+)
+
+# Alertas de callback são texto puro (sem HTML) e limitados a 200 caracteres
+ACCESS_DENIED_ALERT = Template(
+    "🚫 Acesso negado, {first_name}. Seu ID do Telegram não está na lista de usuários autorizados.",
+    dedent=False,
+)
+
+START_BOT_ALERT = Template(
+    "⚠️ Não consigo enviar mensagens para você. Abra uma conversa com @{username}, toque em Iniciar e tente de novo.",
+    dedent=False,
+)
+
+HELP = Template("""\
+    👋 Olá, <b>{first_name}</b>!
+    Aqui está a lista de comandos que você pode usar:
+
+    👤 <b>Clientes:</b>
+    • <code>/cliente &lt;código_do_cliente&gt;</code> — Exibe o status do cliente.
+
+    📡 <b>Equipamentos:</b>
+    • <code>/ont &lt;código_do_cliente&gt;</code> — Verifica o status da ONT.
+    • <code>/cto &lt;código_do_cliente&gt; &lt;código_do_plano&gt;</code> — Verifica a CTO.
+      🔸 <i>Se houver múltiplos planos, informe o código.</i>
+      🔸 <i>Consulta também por <code>/cto &lt;nome_da_cto&gt;</code>.</i>
+      🔸 <i>Busca rápida em qualquer chat: digite o @ do bot seguido do nome da CTO ou do código do cliente.</i>
+
+    📋 <b>Outros Comandos:</b>
+    • <code>/sobreaviso</code> — Mostra o plantonista atual.
+    • <code>/ajuda</code> — Exibe esta mensagem de ajuda.
+""")
+
+SOBREAVISO = Template("""\
+    ⚠️ <b>Sobreaviso</b>
+    <i>(Válido após horário comercial, sábados, domingos e feriados)</i>
+
+    <b>Procedimento:</b> Se o plantonista não atender na primeira tentativa, insista com novas ligações a cada 5 minutos e registre o ocorrido no Redmine.
+
+    • <b>Período:</b> {periodo_inicio} até {periodo_fim}
+    • <b>Plantonista:</b> {nome}
+    • <b>Telefone de plantão:</b> {telefone_plantao}
+    • <b>Telefone particular:</b> {telefone_particular}
+    • <b>Ramal interno:</b> {ramal_interno}
+""")
+
+SOBREAVISO_ERROR = Template("""\
+    🤖❌ <b>Falha na consulta</b>
+
+    Houve um problema ao consultar o serviço de sobreaviso. 
+
+    O sistema pode estar temporariamente indisponível. Por favor, tente novamente em alguns instantes.
+""")
+
+CLIENT_PLAN = Template("""\
+    <b>📶 Plano:</b> ({numero_plano}) {nome_plano}
+    <b>ℹ️ Status PPPoE:</b> {status} {emoji}
+    <b>📄 Estado do Contrato:</b> {status_plano}
+    <b>🌐 IP:</b> <code>{last_ip}</code>
+    <b>📍 Ponto de Acesso:</b> {ponto_acesso}""")
+
+CLIENT_STATUS_ERROR = Template("""\
+    🤖❌ <b>Falha na consulta</b>
+
+    Houve um problema ao consultar o status do cliente. 
+
+    O sistema pode estar temporariamente indisponível. Por favor, tente novamente em alguns instantes.
+""")
+
+API_ERROR = Template("""\
+    ⚠️ <b>Consulta Inválida</b>
+
+    <b>Motivo:</b> "{api_error_msg}"
+
+    Por favor, verifique o código do cliente e tente novamente.
+""")
+
+CPE_BLOCK = Template("""\
+    <b>⚙️ Status:</b> <code>{status}</code>
+    <b>🔢 Serial:</b> <code>{cpeid}</code>
+    <b>📍 Modelo:</b> <code>{modelo}</code>
+    <b>📶 Sinal:</b> <code>{sinal}</code>
+    <b>⏱️ Uptime:</b> <code>{uptime}</code>
+    <b>🌡️ Temp:</b> <code>{temp}°C</code>
+    <b>👤 Cliente:</b> <code>{cid2}</code>
+    <b>📡 Plano:</b> <code>{cid}</code>
+""")
+
+INLINE_CTO = Template("📡 <b>CTO:</b> <code>{name}</code>", dedent=False)
+
+INLINE_SERVICE = Template("""\
+    👤 <b>Cliente:</b> <code>{client_id}</code>
+    📶 <b>Serviço:</b> <code>{service}</code>
+    📝 <b>CTO:</b> <code>{name}</code>
+    🔌 <b>Saída:</b> {point}""")
+
+CTO_STATUS_EMOJIS = {
+    "disponível": "🟢",
+    "em operação": "🔵",
+    "reservado": "🟠",
+    "bloqueado": "🔴"
+}
+
+
 class BotMessage:
     def __init__(self, user: User):
         self.user = user
 
     def welcome_message(self) -> tuple[str, InlineKeyboardMarkup]:
-        text = textwrap.dedent(f"""\
-            👋 Olá, <b>{self.user.first_name}</b>!
-
-            Bem-vindo(a) ao Assistente Virtual da Certto para o time N2.
-            Seu acesso foi verificado com sucesso. ✅
-
-            Estou aqui para simplificar suas tarefas operacionais do dia a dia.
-        """)
+        text = WELCOME.render(first_name=self.user.first_name)
 
         keyboard = [
             [InlineKeyboardButton("Ver Comandos Disponíveis", callback_data="_help")]
@@ -26,72 +137,36 @@ class BotMessage:
         reply_markup = InlineKeyboardMarkup(keyboard)
 
         return text, reply_markup
-    
+
     def access_denied(self) -> str:
-        message = (
-            f"<b>🚫 Acesso negado, {self.user.first_name}.</b>\n\n"
-            "⚠️ Seu ID do Telegram não foi encontrado na lista de usuários autorizados.\n"
-            "ℹ️ Se achar que se trata de um erro, contate o setor de Operações."
-        )
-        return message
+        return ACCESS_DENIED.render(first_name=self.user.first_name)
+
+    def access_denied_alert(self) -> str:
+        return ACCESS_DENIED_ALERT.render(first_name=self.user.first_name)
+
+    def start_bot_alert(self, username: str) -> str:
+        return START_BOT_ALERT.render(username=username)
 
     def help_message(self) -> str:
-        message = textwrap.dedent(f"""\
-            👋 Olá, <b>{self.user.first_name}</b>!
-            Aqui está a lista de comandos que você pode usar:
-
-            👤 <b>Clientes:</b>
-            • <code>/cliente &lt;código_do_cliente&gt;</code> — Exibe o status do cliente.
-
-            📡 <b>Equipamentos:</b>
-            • <code>/ont &lt;código_do_cliente&gt;</code> — Verifica o status da ONT.
-            • <code>/cto &lt;código_do_cliente&gt; &lt;código_do_plano&gt;</code> — Verifica a CTO.
-              🔸 <i>Se houver múltiplos planos, informe o código.</i>
-              🔸 <i>Consulta também por <code>/cto &lt;nome_da_cto&gt;</code>.</i>
-
-            📋 <b>Outros Comandos:</b>
-            • <code>/sobreaviso</code> — Mostra o plantonista atual.
-            • <code>/ajuda</code> — Exibe esta mensagem de ajuda.
-        """)
-        return message
-    
+        return HELP.render(first_name=self.user.first_name)
+
     def message_sobreaviso(self, data: dict) -> str:
         try:
-            nome = data.get("nome", "Desconhecido")
-            periodo_inicio = data.get("periodo_inicio", "Início não informado")
-            periodo_fim = data.get("periodo_fim", "Fim não informado")
-            telefone_plantao = data.get("tel_plantao", "Não informado")
             telefones = data.get("tel", [])
-            
-            telefone_particular = telefones[0] if len(telefones) > 0 else "Não informado"
-            ramal_interno = telefones[1] if len(telefones) > 1 else "Não informado"
-
-            message = textwrap.dedent(f"""\
-                ⚠️ <b>Sobreaviso</b>
-                <i>(Válido após horário comercial, sábados, domingos e feriados)</i>
-
-                <b>Procedimento:</b> Se o plantonista não atender na primeira tentativa, insista com novas ligações a cada 5 minutos e registre o ocorrido no Redmine.
-
-                • <b>Período:</b> {periodo_inicio} até {periodo_fim}
-                • <b>Plantonista:</b> {nome}
-                • <b>Telefone de plantão:</b> {telefone_plantao}
-                • <b>Telefone particular:</b> {telefone_particular}
-                • <b>Ramal interno:</b> {ramal_interno}
-            """)
-            return message
+            return SOBREAVISO.render(
+                nome=data.get("nome", "Desconhecido"),
+                periodo_inicio=data.get("periodo_inicio", "Início não informado"),
+                periodo_fim=data.get("periodo_fim", "Fim não informado"),
+                telefone_plantao=data.get("tel_plantao", "Não informado"),
+                telefone_particular=telefones[0] if len(telefones) > 0 else "Não informado",
+                ramal_interno=telefones[1] if len(telefones) > 1 else "Não informado",
+            )
         except Exception:
             return "Não foi possível formatar as informações de sobreaviso."
-        
+
     def sobreaviso_error(self) -> str:
-        message = textwrap.dedent("""\
-            🤖❌ <b>Falha na consulta</b>
-
-            Houve um problema ao consultar o serviço de sobreaviso. 
-            
-            O sistema pode estar temporariamente indisponível. Por favor, tente novamente em alguns instantes.
-        """)
-        return message
-    
+        return SOBREAVISO_ERROR.render()
+
     def client_status_message(self, data: list) -> str:
         status_emoji = {
             'Connected': '✅',
@@ -104,45 +179,29 @@ class BotMessage:
         for item in data:
             if item.get('login_pppoe'):
                 status = item.get('status_pppoe', 'Desconhecido')
-                emoji = status_emoji.get(status)
-                ponto_acesso = item.get('ponto_acesso') or 'Não informado'
-                
-                plan_info = textwrap.dedent(f"""\
-                    <b>📶 Plano:</b> ({item.get('numero_plano', 'N/A')}) {item.get('nome_plano', 'N/A')}
-                    <b>ℹ️ Status PPPoE:</b> {status} {emoji}
-                    <b>📄 Estado do Contrato:</b> {item.get('status_plano', 'N/A')}
-                    <b>🌐 IP:</b> <code>{item.get('last_ip', 'N/A')}</code>
-                    <b>📍 Ponto de Acesso:</b> {ponto_acesso}""")
-                
-                message_parts.append(plan_info)
+                message_parts.append(CLIENT_PLAN.render(
+                    numero_plano=item.get('numero_plano', 'N/A'),
+                    nome_plano=item.get('nome_plano', 'N/A'),
+                    status=status,
+                    emoji=status_emoji.get(status),
+                    status_plano=item.get('status_plano', 'N/A'),
+                    last_ip=item.get('last_ip', 'N/A'),
+                    ponto_acesso=item.get('ponto_acesso') or 'Não informado',
+                ))
 
         header = message_parts[0]
         plans_section = "\n\n— — — — — — — — — —\n\n".join(message_parts[1:])
-        
+
         if not plans_section:
             return ""
 
         return f"{header}\n\n{plans_section}"
-    
-    def client_status_error(self) -> str:
-        message = textwrap.dedent("""\
-            🤖❌ <b>Falha na consulta</b>
-
-            Houve um problema ao consultar o status do cliente. 
-            
-            O sistema pode estar temporariamente indisponível. Por favor, tente novamente em alguns instantes.
-        """)
-        return message
-    
-    def api_error_message(self, api_error_msg) -> str:
-        message = textwrap.dedent(f"""\
-            ⚠️ <b>Consulta Inválida</b>
 
-            <b>Motivo:</b> "{api_error_msg}"
+    def client_status_error(self) -> str:
+        return CLIENT_STATUS_ERROR.render()
 
-            Por favor, verifique o código do cliente e tente novamente.
-        """)
-        return message
+    def api_error_message(self, api_error_msg) -> str:
+        return API_ERROR.render(api_error_msg=api_error_msg)
 
     def build_cpestatus_message(self, details: list) -> str:
         if not details:
@@ -151,31 +210,54 @@ class BotMessage:
         ont_blocks = []
 
         for item in details:
-            cid = item.get('cid') or 'Sem dados'
-            cid2 = item.get('cid2') or 'Sem dados'
-            cpeid = item.get('cpeid') or 'Sem dados'
             modelo = item.get('Modelo') or 'Sem dados'
             sinal_raw = item.get('Sinal')
             sinal = cf.eval_power(sinal_raw) if modelo == 'ONT142NG' else sinal_raw
-            
-            ont_info = textwrap.dedent(f"""\
-                <b>⚙️ Status:</b> <code>{cf.getState_pretty(item.get('state'))}</code>
-                <b>🔢 Serial:</b> <code>{cpeid}</code>
-                <b>📍 Modelo:</b> <code>{modelo}</code>
-                <b>📶 Sinal:</b> <code>{cf.eval_power_pretty(sinal)}</code>
-                <b>⏱️ Uptime:</b> <code>{cf.convert_uptime(item.get('Uptime'))}</code>
-                <b>🌡️ Temp:</b> <code>{cf.temp_f_2_c(item.get('Temp'), modelo)}°C</code>
-                <b>👤 Cliente:</b> <code>{cid2}</code>
-                <b>📡 Plano:</b> <code>{cid}</code>
-            """)
-            ont_blocks.append(ont_info)
+            ont_blocks.append(CPE_BLOCK.render(
+                status=cf.getState_pretty(item.get('state')),
+                cpeid=item.get('cpeid') or 'Sem dados',
+                modelo=modelo,
+                sinal=cf.eval_power_pretty(sinal),
+                uptime=cf.convert_uptime(item.get('Uptime')),
+                temp=cf.temp_f_2_c(item.get('Temp'), modelo),
+                cid2=item.get('cid2') or 'Sem dados',
+                cid=item.get('cid') or 'Sem dados',
+            ))
 
         header = f"<b>📡 Equipamentos do Cliente:</b>"
-        
+
         body = "\n— — — — — — — — — —\n\n".join(ont_blocks)
-        
+
         return f"{header}\n\n{body}"
-    
+
+    def _cto_button(self, box_id, name: str):
+        if box_id is None:
+            return None
+        return InlineKeyboardMarkup([[InlineKeyboardButton(f"Ver Detalhes da CTO {name}", callback_data=f"cto_full_{box_id}")]])
+
+    def inline_results(self, kind: str, results: list, limit: int = 20) -> list:
+        """Artigos do modo inline: cada um envia um resumo com o botão de detalhes da CTO."""
+        articles = []
+        for item in results[:limit]:
+            if kind == "box":
+                title = item["name"]
+                description = "Ver saídas e status das ONTs"
+                text = INLINE_CTO.render(name=item["name"])
+                result_id = f"box:{item['box_id']}"
+            else:
+                title = f"Cliente {item['client_id']} · serviço {item['service']}"
+                description = f"{item['name']} · saída {item['point']}"
+                text = INLINE_SERVICE.render(**item)
+                result_id = f"srv:{item['client_id']}:{item['service']}"
+            articles.append(InlineQueryResultArticle(
+                id=result_id[:64],
+                title=title,
+                description=description,
+                input_message_content=InputTextMessageContent(text, parse_mode="HTML"),
+                reply_markup=self._cto_button(item.get("box_id"), item["name"]),
+            ))
+        return articles
+
     def mensagem_cto_data(self) -> str:
         return (
             "<b>🔍 Resultado da Verificação</b>\n"
@@ -186,47 +268,43 @@ class BotMessage:
             "<b>📝 CTO:</b> {cto}\n"
             "<b>🔌 Saída:</b> {point}"
         )
-    
-    def build_message_cto(self, result: dict, cpe_status: dict = None) -> str:
+
+    def build_message_cto(self, result: dict, cpe_status: dict = None, pending: set = None) -> str:
         box_name = result.get("box_full_name", "N/A")
         points = result.get("points", [])
         if not points:
             return f"Nenhuma saída encontrada para a CTO {box_name}."
-        status_emojis = {
-            "disponível": "🟢",
-            "em operação": "🔵",
-            "reservado": "🟠",
-            "bloqueado": "🔴"
-        }
         status_counts = {
             "disponível": 0,
             "em operação": 0,
             "reservado": 0,
             "bloqueado": 0
         }
-        mensagem = (
-            f"<b>📡 {box_name}:</b>\n\n"
-            "— — — — — — — — — — — — —\n\n"
-        )
+        # f-strings já são templates compilados; as partes são unidas uma única vez no final
+        parts = [f"<b>📡 {box_name}:</b>\n\n", CTO_SEPARATOR]
         for point in points:
             status = point.get("status_name", "N/A").lower()
             if status in status_counts:
                 status_counts[status] += 1
+            if status not in ("em operação", "reservado"):
+                continue
             attributes = point.get("attributes", {})
             sinal_base = point.get("verified_signal", "N/A")
             saida = point.get("point_name", "N/A")
-            cliente = attributes.get("cod_cli_active", "N/A")
             plano = attributes.get("cod_srv_hsi", "N/A")
-            cod_reserva = attributes.get("cod_opportunity")
-            status_emoji = status_emojis.get(status, "⚪")
+            status_emoji = CTO_STATUS_EMOJIS.get(status, "⚪")
             if status == "em operação":
+                cliente = attributes.get("cod_cli_active", "N/A")
                 sinal_cpe = "N/A"
                 cpe_online_status = "Desconhecido ❓"
                 if cpe_status and cliente in cpe_status:
                     sinal_cpe = cpe_status[cliente].get("Sinal", "Desconhecido")
                     state = cpe_status[cliente].get("state")
                     cpe_online_status = cf.getState_pretty(state)
-                mensagem += (
+                elif pending and cliente in pending:
+                    sinal_cpe = "⏳"
+                    cpe_online_status = "Consultando... ⏳"
+                parts.append(
                     f"<b>🔹 Saída:</b> {saida}\n"
                     f"<b>💡 λ base:</b> {sinal_base}\n"
                     f"<b>👤 Cliente:</b> {cliente}\n"
@@ -234,25 +312,25 @@ class BotMessage:
                     f"<b>📊 Sinal CPE:</b> {sinal_cpe}\n"
                     f"<b>📟 ONT:</b> {cpe_online_status}\n"
                     f"<b>📌 Status:</b> {status_emoji} {status.title()}\n\n"
-                    "— — — — — — — — — — — — —\n\n"
                 )
-            elif status == "reservado":
-                mensagem += (
+            else:
+                parts.append(
                     f"<b>🔹 Saída:</b> {saida}\n"
                     f"<b>💡 λ base:</b> {sinal_base}\n"
-                    f"<b>👤 Cliente:</b> {cod_reserva}\n"
+                    f"<b>👤 Cliente:</b> {attributes.get('cod_opportunity')}\n"
                     f"<b>📶 Plano:</b> {plano}\n"
                     f"<b>📌 Status:</b> {status_emoji} {status.title()}\n\n"
-                    "— — — — — — — — — — — — —\n\n"
                 )
-        mensagem += "<b>📊 Resumo por status:</b>\n"
+            parts.append(CTO_SEPARATOR)
+        parts.append("<b>📊 Resumo por status:</b>\n")
         for stat_key in ["disponível", "em operação"]:
-            count = status_counts[stat_key]
-            emoji = status_emojis.get(stat_key, "⚪")
-            mensagem += f"{emoji} {stat_key.title()}: {count}\n"
+            parts.append(f"{CTO_STATUS_EMOJIS.get(stat_key, '⚪')} {stat_key.title()}: {status_counts[stat_key]}\n")
         for stat_key in ["reservado", "bloqueado"]:
             count = status_counts[stat_key]
             if count > 0:
-                emoji = status_emojis.get(stat_key, "⚪")
-                mensagem += f"{emoji} {stat_key.title()}: {count}\n"
-        return mensagem.strip()
+                parts.append(f"{CTO_STATUS_EMOJIS.get(stat_key, '⚪')} {stat_key.title()}: {count}\n")
+        return "".join(parts).strip()
+
+    def build_message_cto_parts(self, result: dict, cpe_status: dict = None, pending: set = None) -> list:
+        """Mesma mensagem de `build_message_cto`, dividida em partes dentro do limite do Telegram."""
+        return split_message(self.build_message_cto(result, cpe_status, pending), separator=CTO_SEPARATOR)
@@ -0,0 +1,210 @@
+import bisect
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def render(self) -> list:
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in self._values.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series["counts"][index] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = self.header()
+        for key, series in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {series['count']}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """Registra uma função que devolve métricas calculadas na hora da coleta (ex.: estatísticas de cache)."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                for metric in collector():
+                    lines.extend(metric.render())
+            except Exception as e:
+                logging.warning(f"Falha no coletor de métricas {getattr(collector, '__name__', collector)}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+def snapshot(metric_cls, name: str, documentation: str, values: dict, labelnames: tuple = ()) -> Metric:
+    """Monta uma métrica a partir de valores já calculados; `values` mapeia tuplas de labels (ou () sem labels) para números."""
+    metric = metric_cls(name, documentation, labelnames)
+    for key, value in values.items():
+        metric._values[key if isinstance(key, tuple) else (str(key),)] = value
+    return metric
+
+
+registry = Registry()
+
+command_latency = registry.histogram(
+    "n2bot_command_duration_seconds", "Duração dos comandos e callbacks do bot.", ("command",))
+commands_in_flight = registry.gauge(
+    "n2bot_commands_in_flight", "Comandos em processamento no momento.", ("command",))
+upstream_latency = registry.histogram(
+    "n2bot_upstream_request_duration_seconds", "Duração das requisições aos upstreams.", ("upstream", "method", "status"))
+upstream_retries = registry.counter(
+    "n2bot_upstream_retries_total", "Novas tentativas de requisição por upstream.", ("upstream",))
+upstream_in_flight = registry.gauge(
+    "n2bot_upstream_in_flight", "Requisições em andamento por upstream.", ("upstream",))
+box_fanout = registry.histogram(
+    "n2bot_cto_fanout_points", "Número de pontos consultados por verificação de CTO.", buckets=(4, 8, 16, 24, 32, 48, 64, 128))
+
+
+class MetricsServer:
+    """Listener HTTP local que expõe /metrics no formato texto do Prometheus."""
+
+    def __init__(self):
+        self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def start(self):
+        # Porta 0 desliga o listener
+        port = int(os.environ.get('N2BOT_METRICS_PORT', 9464) or 0)
+        if not port or self._runner is not None:
+            return
+        host = os.environ.get('N2BOT_METRICS_HOST', '127.0.0.1')
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, host, port).start()
+        except OSError as e:
+            # Métricas são acessórias: porta ocupada não impede o bot de subir
+            logging.warning(f"Listener de métricas não iniciado em {host}:{port}: {e}")
+            await self._runner.cleanup()
+            self._runner = None
+            return
+        logging.info(f"Métricas disponíveis em http://{host}:{port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+metrics_server = MetricsServer()
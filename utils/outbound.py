@@ -0,0 +1,301 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from utils.metrics import Counter, registry, snapshot
+
+# Prioridade de envio (menor vai primeiro): respostas a callbacks, respostas finais e, por último, progresso
+URGENT = 0
+REPLY = 1
+PROGRESS = 2
+PRIORITY_NAMES = ("urgent", "reply", "progress")
+
+WAIT_TEXT = "⏳ Processando sua solicitação, aguarde..."
+
+# Endpoints que o usuário está esperando na tela (o Telegram mostra um "carregando" até a resposta)
+_URGENT_ENDPOINTS = {"answerCallbackQuery", "answerInlineQuery"}
+
+_priority = contextvars.ContextVar("n2bot_send_priority", default=None)
+# Chamado pelo limitador quando a chamada sai da fila (daí em diante cancelá-la pode deixar a mensagem enviada)
+_on_send = contextvars.ContextVar("n2bot_on_send", default=None)
+
+telegram_requests = registry.counter(
+    "n2bot_telegram_requests_total", "Chamadas à Bot API do Telegram por endpoint.", ("endpoint",))
+telegram_wait = registry.histogram(
+    "n2bot_telegram_wait_seconds", "Espera no limitador antes de chamar a Bot API.", ("priority",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30))
+telegram_retry_after = registry.counter(
+    "n2bot_telegram_retry_after_total", "Respostas RetryAfter (flood) recebidas da Bot API.", ("scope",))
+
+
+@contextmanager
+def send_priority(priority: int):
+    """Define a prioridade das chamadas à Bot API feitas dentro do bloco (inclusive por atalhos de Message)."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _seconds(retry_after) -> float:
+    return retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waiting = [0] * len(PRIORITY_NAMES)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Segundos até haver uma ficha (0 se já houver)."""
+        self._refill(now)
+        missing = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(missing, self.paused_until - now)
+
+    def take(self):
+        self.tokens -= 1
+
+    @property
+    def idle(self) -> bool:
+        return self.tokens >= self.burst and not any(self.waiting)
+
+
+class FloodRateLimiter(BaseRateLimiter):
+    """Limitador da Bot API com baldes de fichas global e por chat, fila por prioridade e respeito ao RetryAfter.
+
+    A prioridade vem de `rate_limit_args={"priority": ...}`, de `send_priority()` ou do endpoint; chamadas de
+    menor prioridade esperam enquanto houver outras mais urgentes no mesmo chat ou disputando o balde global.
+    """
+
+    def __init__(self, overall_rate: float = 30, chat_rate: float = 1, group_rate: float = 20 / 60,
+                 burst: float = 3, max_retries: int = 2, max_chats: int = 4096):
+        self.overall = TokenBucket(overall_rate, overall_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._chats = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "FloodRateLimiter":
+        return cls(
+            overall_rate=float(os.environ.get('N2BOT_TELEGRAM_OVERALL_RATE', 30)),
+            chat_rate=float(os.environ.get('N2BOT_TELEGRAM_CHAT_RATE', 1)),
+            group_rate=float(os.environ.get('N2BOT_TELEGRAM_GROUP_RATE', 20 / 60)),
+            burst=float(os.environ.get('N2BOT_TELEGRAM_CHAT_BURST', 3)),
+            max_retries=int(os.environ.get('N2BOT_TELEGRAM_MAX_RETRIES', 2)),
+        )
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chats:
+                for key in [key for key, old in self._chats.items() if old.idle]:
+                    del self._chats[key]
+            # Grupos (id negativo ou @canal) têm limite por minuto bem menor que chats privados
+            try:
+                is_group = int(chat_id) < 0
+            except (TypeError, ValueError):
+                is_group = True
+            bucket = self._chats[chat_id] = TokenBucket(self.group_rate if is_group else self.chat_rate, self.burst)
+        return bucket
+
+    def _priority_for(self, endpoint: str, rate_limit_args) -> int:
+        if isinstance(rate_limit_args, dict) and "priority" in rate_limit_args:
+            return rate_limit_args["priority"]
+        priority = _priority.get()
+        if priority is not None:
+            return priority
+        return URGENT if endpoint in _URGENT_ENDPOINTS else REPLY
+
+    async def _acquire(self, chat, priority: int):
+        buckets = (self.overall, chat) if chat is not None else (self.overall,)
+        for bucket in buckets:
+            bucket.waiting[priority] += 1
+        start = time.monotonic()
+        try:
+            while True:
+                now = time.monotonic()
+                wait = max(bucket.delay(now) for bucket in buckets)
+                ahead_global = sum(self.overall.waiting[:priority])
+                ahead_chat = sum(chat.waiting[:priority]) if chat is not None else 0
+                if wait <= 0 and not ahead_chat and self.overall.tokens >= 1 + ahead_global:
+                    for bucket in buckets:
+                        bucket.take()
+                    return
+                await asyncio.sleep(wait if wait > 0 else 1 / self.overall.rate)
+        finally:
+            for bucket in buckets:
+                bucket.waiting[priority] -= 1
+            telegram_wait.observe(time.monotonic() - start, priority=PRIORITY_NAMES[priority])
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        chat = self._chat_bucket(chat_id) if chat_id is not None else None
+        priority = self._priority_for(endpoint, rate_limit_args)
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat, priority)
+            on_send = _on_send.get()
+            if on_send is not None:
+                on_send()
+            telegram_requests.inc(endpoint=endpoint)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                seconds = _seconds(e.retry_after)
+                # Com chat, a espera vale só para ele; sem chat, segura todas as chamadas
+                bucket, scope = (chat, "chat") if chat is not None else (self.overall, "global")
+                bucket.paused_until = max(bucket.paused_until, time.monotonic() + seconds)
+                telegram_retry_after.inc(scope=scope)
+                logging.warning(f"Bot API pediu {seconds:.0f}s de espera em {endpoint} (chat {chat_id}); nova tentativa {attempt + 1}.")
+
+
+class EditCoalescer:
+    """Aglutina edições seguidas da mesma mensagem: enquanto uma edição está em voo, só a última pendente é enviada."""
+
+    def __init__(self):
+        self._slots = {}
+        self.coalesced = 0
+        self.unchanged = 0
+
+    @staticmethod
+    def _key(message):
+        message_id = getattr(message, "message_id", None)
+        return (getattr(message, "chat_id", None), message_id) if message_id is not None else id(message)
+
+    async def edit(self, message, text: str, **kwargs):
+        key = self._key(message)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = {"lock": asyncio.Lock(), "latest": None, "last_text": None, "users": 0}
+        slot["users"] += 1
+        slot["latest"] = (text, kwargs)
+        try:
+            async with slot["lock"]:
+                if slot["latest"] is None:
+                    # Uma chamada posterior já enviou um texto mais novo
+                    self.coalesced += 1
+                    return
+                text, kwargs = slot["latest"]
+                slot["latest"] = None
+                if text == slot["last_text"] and not kwargs.get("reply_markup"):
+                    # O Telegram recusa edições sem mudança ("message is not modified")
+                    self.unchanged += 1
+                    return
+                await message.edit_text(text, **kwargs)
+                slot["last_text"] = text
+        finally:
+            slot["users"] -= 1
+            if not slot["users"]:
+                self._slots.pop(key, None)
+
+
+coalescer = EditCoalescer()
+
+
+async def edit(message, text: str, **kwargs):
+    await coalescer.edit(message, text, **kwargs)
+
+
+class ProgressReply:
+    """Resposta de um comando editada no lugar.
+
+    O aviso "⏳" só é enviado se a resposta demorar mais que `delay`; a resposta final edita esse aviso
+    (ou é enviada direto), em vez de enviar, apagar e enviar de novo. Se a resposta ficar pronta enquanto o
+    aviso ainda espera no limitador da Bot API, o aviso é descartado e a resposta sai no lugar dele.
+    """
+
+    def __init__(self, message, delay: float = None):
+        self.message = message
+        self.delay = float(os.environ.get('N2BOT_PROGRESS_DELAY', 0.8)) if delay is None else delay
+        self.sent = None
+        self._lock = asyncio.Lock()
+        self._timer = None
+        self._committed = False
+
+    @property
+    def chat(self):
+        return self.message.chat
+
+    def start(self) -> "ProgressReply":
+        self._timer = asyncio.create_task(self._show_placeholder())
+        return self
+
+    def _commit(self):
+        self._committed = True
+
+    async def _show_placeholder(self):
+        await asyncio.sleep(self.delay)
+        if getattr(self.message.get_bot(), "rate_limiter", None) is None:
+            # Sem limitador não há fila: a chamada vai direto à Bot API
+            self._commit()
+        _on_send.set(self._commit)
+        try:
+            with send_priority(PROGRESS):
+                self.sent = await self.message.reply_text(WAIT_TEXT)
+        except Exception as e:
+            logging.debug(f"Aviso de processamento não enviado: {e}")
+
+    def _cancel_timer(self):
+        # Antes de sair da fila do limitador o aviso ainda não foi enviado: cancelar não perde mensagem
+        if self._timer is not None and not self._timer.done() and not self._committed:
+            self._timer.cancel()
+
+    async def edit_text(self, text: str, **kwargs):
+        async with self._lock:
+            self._cancel_timer()
+            if self._timer is not None and not self._timer.done():
+                # O aviso já está a caminho: espera-o para editá-lo, sem cancelá-lo se esta chamada for cancelada
+                await asyncio.wait([self._timer])
+            if self.sent is None:
+                self.sent = await self.message.reply_text(text, **kwargs)
+                return self.sent
+        await coalescer.edit(self.sent, text, **kwargs)
+        return self.sent
+
+    def close(self):
+        self._cancel_timer()
+
+
+@asynccontextmanager
+async def progress(message, delay: float = None):
+    """`async with progress(update.effective_message) as reply: ... await reply.edit_text(texto)`"""
+    reply = ProgressReply(message, delay).start()
+    try:
+        yield reply
+    finally:
+        reply.close()
+
+
+def _collect_outbound():
+    return [snapshot(Counter, "n2bot_telegram_edits_skipped_total", "Edições de mensagem não enviadas à Bot API.",
+                     {("coalesced",): coalescer.coalesced, ("unchanged",): coalescer.unchanged}, ("reason",))]
+
+
+registry.add_collector(_collect_outbound)
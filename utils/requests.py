@@ -1,13 +1,90 @@
 import asyncio
 import logging
+import os
 import time
 from json import JSONDecodeError
 
 import aiohttp
 
+import utils.audit as audit
+import utils.deadline as deadline
+from utils.circuit_breaker import breakers
+from utils.metrics import Counter, Gauge, registry, snapshot, upstream_in_flight, upstream_latency, upstream_retries
+from utils.retry import backoff, is_retryable, retry_budget
+from utils.scheduler import SchedulerTimeout, current_priority, scheduler
+from utils.singleflight import SingleFlight
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 
+class SessionPool:
+    """Sessão aiohttp única do processo, com keep-alive e cache de DNS por upstream."""
+
+    def __init__(self):
+        self._session = None
+
+    def _build_connector(self) -> aiohttp.TCPConnector:
+        return aiohttp.TCPConnector(
+            limit=int(os.environ.get('N2BOT_HTTP_POOL_LIMIT', 100)),
+            limit_per_host=int(os.environ.get('N2BOT_HTTP_POOL_LIMIT_PER_HOST', 20)),
+            keepalive_timeout=float(os.environ.get('N2BOT_HTTP_KEEPALIVE_TIMEOUT', 30)),
+            ttl_dns_cache=int(os.environ.get('N2BOT_HTTP_DNS_CACHE_TTL', 300)),
+            ssl=False,
+        )
+
+    async def open(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(connector=self._build_connector())
+            logging.info("Sessão HTTP compartilhada aberta.")
+        return self._session
+
+    async def get(self) -> aiohttp.ClientSession:
+        # Abre sob demanda caso a aplicação não tenha passado pelo post_init
+        if self._session is None or self._session.closed:
+            return await self.open()
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logging.info("Sessão HTTP compartilhada encerrada.")
+        self._session = None
+
+
+session_pool = SessionPool()
+inflight_gets = SingleFlight()
+hedge_stats = {"hedged": 0, "hedge_won": 0}
+
+
+def error_label(e: Exception) -> str:
+    if isinstance(e, aiohttp.ClientResponseError):
+        return str(e.status)
+    return type(e).__name__
+
+
+def _collect_http_stats():
+    dedup = inflight_gets.stats()
+    budget = retry_budget.stats()
+    states = breakers.snapshot()
+    return [
+        snapshot(Counter, "n2bot_singleflight_total", "GETs por papel no single-flight (líder ou agrupado).",
+                 {("leader",): dedup["leaders"], ("coalesced",): dedup["coalesced"]}, ("role",)),
+        snapshot(Counter, "n2bot_hedged_requests_total", "Requisições hedge disparadas e vencidas.",
+                 {("sent",): hedge_stats["hedged"], ("won",): hedge_stats["hedge_won"]}, ("outcome",)),
+        snapshot(Gauge, "n2bot_retry_budget_tokens", "Fichas disponíveis no orçamento de novas tentativas.",
+                 {(): budget["tokens"]}),
+        snapshot(Counter, "n2bot_retry_budget_rejected_total", "Novas tentativas negadas pelo orçamento.",
+                 {(): budget["rejected"]}),
+        snapshot(Gauge, "n2bot_breaker_open", "1 quando o disjuntor do upstream não está fechado.",
+                 {(name,): int(state["state"] != "closed") for name, state in states.items()}, ("upstream",)),
+        snapshot(Counter, "n2bot_breaker_rejected_total", "Requisições recusadas pelo disjuntor.",
+                 {(name,): state["rejected"] for name, state in states.items()}, ("upstream",)),
+    ]
+
+
+registry.add_collector(_collect_http_stats)
+
+
 class RequestsMethods:
     def __init__(self):
         pass
@@ -44,46 +121,145 @@ class RequestsMethods:
             logging.exception(f"Erro inesperado '{type(e).__name__}' durante a requisição para {url}")
             return {"error": True, "message": "Ocorreu um erro inesperado."}
 
-    async def get(self, url, headers=None, timeout=20, retries=3, delay=2):
-        for attempt in range(retries):
-            start_time = time.time()
-            try:
-                request_timeout = aiohttp.ClientTimeout(total=timeout)
-                async with aiohttp.ClientSession(timeout=request_timeout) as session:
-                    async with session.get(url, headers=headers, ssl=False) as response:
-                        response.raise_for_status()
-                        response = await response.json()
-                        logging.info(f"GET para {url} concluído em {time.time() - start_time:.2f} segundos")
-                        return response
-            except asyncio.TimeoutError:
-                logging.warning(f"Timeout na tentativa {attempt + 1}/{retries} para a URL: {url}. Nova tentativa em {delay}s...")
-                await asyncio.sleep(delay)
-            except Exception as e:
-                return self._handle_exceptions(e, url, start_time)
-        logging.error(f"Falha ao obter dados de {url} após {retries} tentativas.")
-        return {
-            "error": True,
-            "message": f"A requisição excedeu o número máximo de {retries} tentativas devido a timeouts."
-        }
-        
-    async def post(self, url, headers=None, json=None, timeout=20, retries=3, delay=2):
+    async def get(self, url, headers=None, timeout=20, retries=3, delay=2, hedge_after=None, slow_after=None):
+        # GETs idênticos em andamento (mesma URL, headers e timeout) compartilham a mesma resposta
+        # A prioridade entra na chave: uma consulta interativa não fica presa atrás de uma varredura em massa na fila
+        key = (current_priority(), url, tuple(sorted((headers or {}).items())), timeout)
+        # Só entra numa requisição em andamento se o prazo de quem a lidera cobre uma tentativa inteira deste chamador
+        expires_at = deadline.expires_at()
+        needed_until = time.monotonic() + timeout
+        if expires_at is not None:
+            needed_until = min(needed_until, expires_at)
+        response = await inflight_gets.do(
+            key, lambda: self._request("GET", url, headers=headers, timeout=timeout, retries=retries,
+                                       delay=delay, hedge_after=hedge_after, slow_after=slow_after),
+            expires_at=expires_at, needed_until=needed_until,
+        )
+        return self._audit(url, response)
+
+    async def post(self, url, headers=None, json=None, timeout=20, retries=3, delay=2, slow_after=None):
+        response = await self._request("POST", url, headers=headers, json=json, timeout=timeout, retries=retries, delay=delay,
+                                       slow_after=slow_after)
+        return self._audit(url, response)
+
+    def _audit(self, url, response):
+        if isinstance(response, dict) and response.get("error") is True:
+            audit.note_upstream_error(breakers.for_url(url).name)
+        return response
+
+    async def _attempt(self, session, method, url, headers, json, timeout, start_time):
+        request_timeout = aiohttp.ClientTimeout(total=timeout)
+        async with session.request(method, url, headers=headers, json=json, timeout=request_timeout, ssl=False) as response:
+            response.raise_for_status()
+            response = await response.json()
+            logging.info(f"{method} para {url} concluído em {time.time() - start_time:.2f} segundos")
+            return response
+
+    async def _hedged(self, session, upstream, url, headers, timeout, hedge_after, start_time):
+        """GET idempotente: se a primeira tentativa demorar mais que `hedge_after`, dispara uma segunda e usa a que responder antes.
+
+        A segunda ocupa uma vaga própria no escalonador e só parte se houver uma livre na hora: com o upstream
+        já lento, o hedge não pode passar do limite por upstream nem do limite adaptativo.
+        """
+        first = asyncio.ensure_future(self._attempt(session, "GET", url, headers, None, timeout, start_time))
+        done, _ = await asyncio.wait({first}, timeout=hedge_after)
+        if done or timeout <= hedge_after or not scheduler.try_take(upstream):
+            return await first
+        if not retry_budget.try_spend():
+            scheduler.release(upstream)
+            return await first
+
+        logging.info(f"GET para {url} sem resposta após {hedge_after:.2f}s; disparando requisição hedge.")
+        hedge_stats["hedged"] += 1
+        second = asyncio.ensure_future(self._attempt(session, "GET", url, headers, None, timeout - hedge_after, start_time))
+        second.add_done_callback(lambda _: scheduler.release(upstream))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            hedge_stats["hedge_won"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _request(self, method, url, headers=None, json=None, timeout=20, retries=3, delay=2, hedge_after=None,
+                       slow_after=None):
+        breaker = breakers.for_url(url)
+        with upstream_in_flight.track(upstream=breaker.name):
+            return await self._request_attempts(breaker, method, url, headers, json, timeout, retries, delay, hedge_after,
+                                                slow_after)
+
+    async def _request_attempts(self, breaker, method, url, headers, json, timeout, retries, delay, hedge_after, slow_after):
+        session = await session_pool.get()
+        retry_budget.record_request()
+        error, start_time = None, time.time()
         for attempt in range(retries):
-            start_time = time.time()
+            cut_short = False
+            if not breaker.allow():
+                # Falha rápida com a mesma mensagem de indisponibilidade do servidor
+                logging.warning(f"Disjuntor '{breaker.name}' aberto; requisição para {url} recusada.")
+                return {"error": True, "message": "Erro: Falha ao tentar conectar com o servidor."}
             try:
-                request_timeout = aiohttp.ClientTimeout(total=timeout)
-                async with aiohttp.ClientSession(timeout=request_timeout) as session:
-                    async with session.post(url, headers=headers, json=json, ssl=False) as response:
-                        response.raise_for_status()
-                        response = await response.json()
-                        logging.info(f"POST para {url} concluído em {time.time() - start_time:.2f} segundos")
-                        return response
-            except asyncio.TimeoutError:
-                logging.warning(f"Timeout na tentativa {attempt + 1}/{retries} para a URL: {url}. Nova tentativa em {delay}s...")
-                await asyncio.sleep(delay)
+                # A espera por vaga no escalonador consome o prazo, mas não entra na latência do upstream
+                async with scheduler.slot(breaker.name, timeout=deadline.remaining()):
+                    budget = deadline.remaining()
+                    if budget is not None and budget <= 0:
+                        logging.warning(f"Prazo do comando esgotado antes da tentativa {attempt + 1} para a URL: {url}")
+                        break
+                    attempt_timeout = timeout if budget is None else min(timeout, budget)
+                    cut_short = attempt_timeout < timeout
+                    start_time = time.time()
+                    if hedge_after and method == "GET":
+                        response = await self._hedged(session, breaker.name, url, headers, attempt_timeout, hedge_after, start_time)
+                    else:
+                        response = await self._attempt(session, method, url, headers, json, attempt_timeout, start_time)
+                latency = time.time() - start_time
+                breaker.record(True, latency, slow_after)
+                scheduler.record(breaker.name, latency, True)
+                upstream_latency.observe(latency, upstream=breaker.name, method=method, status="ok")
+                return response
+            except SchedulerTimeout as e:
+                error = e
+                logging.warning(f"{e}; requisição para {url} abandonada sem chegar ao upstream.")
+                break
             except Exception as e:
-                return self._handle_exceptions(e, url, start_time)
-        logging.error(f"Falha ao obter dados de {url} após {retries} tentativas.")
-        return {
-            "error": True,
-            "message": f"A requisição excedeu o número máximo de {retries} tentativas devido a timeouts."
-        }
+                error = e
+                latency = time.time() - start_time
+                if cut_short and isinstance(e, asyncio.TimeoutError):
+                    # Timeout imposto pelo prazo do próprio comando, não pelo upstream: fica fora do disjuntor
+                    # e do limite adaptativo, que são compartilhados por todos os usuários
+                    upstream_latency.observe(latency, upstream=breaker.name, method=method, status="deadline")
+                    logging.warning(f"Prazo do comando esgotado durante a tentativa {attempt + 1} para a URL: {url}")
+                    break
+                # Erros 4xx e de conteúdo mostram um upstream que responde: não contam contra o disjuntor
+                breaker.record(not is_retryable(e), latency, slow_after)
+                scheduler.record(breaker.name, latency, not is_retryable(e))
+                upstream_latency.observe(latency, upstream=breaker.name, method=method, status=error_label(e))
+                if not is_retryable(e) or attempt == retries - 1:
+                    break
+                wait = backoff(delay, attempt)
+                budget = deadline.remaining()
+                if budget is not None and wait >= budget:
+                    logging.warning(f"Sem prazo restante para nova tentativa na URL: {url}")
+                    break
+                if not retry_budget.try_spend():
+                    logging.warning(f"Orçamento de novas tentativas esgotado; desistindo da URL: {url}")
+                    break
+                logging.warning(f"{type(e).__name__} na tentativa {attempt + 1}/{retries} para a URL: {url}. Nova tentativa em {wait:.2f}s...")
+                upstream_retries.inc(upstream=breaker.name)
+                await asyncio.sleep(wait)
+
+        if error is None or isinstance(error, asyncio.TimeoutError):
+            logging.error(f"Falha ao obter dados de {url} após {retries} tentativas.")
+            return {
+                "error": True,
+                "message": f"A requisição excedeu o número máximo de {retries} tentativas devido a timeouts."
+            }
+        return self._handle_exceptions(error, url, start_time)
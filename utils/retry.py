@@ -0,0 +1,55 @@
+import asyncio
+import os
+import random
+
+import aiohttp
+
+
+class RetryBudget:
+    """Limita novas tentativas a uma fração das requisições, evitando tempestades de retry."""
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self.retries = 0
+        self.rejected = 0
+
+    def configure(self, ratio: float = None, max_tokens: float = None):
+        if ratio is not None:
+            self.ratio = ratio
+        if max_tokens is not None:
+            self.max_tokens = max_tokens
+            self._tokens = min(self._tokens, max_tokens)
+
+    def record_request(self):
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self._tokens >= 1:
+            self._tokens -= 1
+            self.retries += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def stats(self) -> dict:
+        return {"tokens": round(self._tokens, 2), "retries": self.retries, "rejected": self.rejected}
+
+
+retry_budget = RetryBudget()
+
+
+def is_retryable(e: Exception) -> bool:
+    if isinstance(e, asyncio.TimeoutError):
+        return True
+    if isinstance(e, aiohttp.ClientResponseError):
+        return e.status >= 500 or e.status == 429
+    return isinstance(e, aiohttp.ClientConnectionError)
+
+
+def backoff(base: float, attempt: int) -> float:
+    """Backoff exponencial com jitter (metade fixa, metade aleatória), limitado por N2BOT_RETRY_MAX_DELAY."""
+    cap = float(os.environ.get('N2BOT_RETRY_MAX_DELAY', 8))
+    ceiling = min(cap, base * (2 ** attempt))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
@@ -0,0 +1,208 @@
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+
+from utils.metrics import Gauge, registry, snapshot
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, BULK)
+
+_user = contextvars.ContextVar("n2bot_scheduler_user", default=None)
+_priority = contextvars.ContextVar("n2bot_scheduler_priority", default=INTERACTIVE)
+
+queue_wait = registry.histogram(
+    "n2bot_scheduler_wait_seconds", "Tempo na fila do escalonador antes de chegar ao upstream.", ("upstream", "priority"),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10))
+
+
+@contextmanager
+def user_scope(user_id):
+    token = _user.set(user_id)
+    try:
+        yield
+    finally:
+        _user.reset(token)
+
+
+@contextmanager
+def priority_scope(priority: str):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+class SchedulerTimeout(asyncio.TimeoutError):
+    """A requisição não conseguiu vaga dentro do prazo; o upstream não chegou a ser chamado."""
+
+
+def parse_limits(value: str) -> dict:
+    """'cpestatus:16,cto:8' -> {'cpestatus': 16, 'cto': 8}"""
+    limits = {}
+    for item in (value or "").split(","):
+        name, _, limit = item.strip().partition(":")
+        if name and limit.strip().isdigit():
+            limits[name] = int(limit)
+    return limits
+
+
+class FairScheduler:
+    """Limita requisições simultâneas (total e por upstream) e reparte as vagas entre usuários em rodízio.
+
+    Consultas interativas (um cliente) passam à frente das varreduras em massa (todas as portas de uma CTO).
+    """
+
+    def __init__(self):
+        self._in_flight = 0
+        self._per_upstream = {}
+        # prioridade -> usuário -> fila de (upstream, future); a ordem dos usuários define o rodízio
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._adaptive = {}
+        self.max_concurrency = 64
+        self.upstream_limits = {}
+
+    def configure(self, max_concurrency: int = None, upstream_limits: dict = None):
+        if max_concurrency is not None:
+            self.max_concurrency = max_concurrency
+        if upstream_limits is not None:
+            self.upstream_limits = upstream_limits
+
+    def set_adaptive_limit(self, upstream: str, limiter):
+        """Substitui o limite fixo do upstream por um limite dinâmico (`limiter.limit`, ajustado por `record`)."""
+        self._adaptive[upstream] = limiter
+
+    def limit_for(self, upstream: str):
+        limiter = self._adaptive.get(upstream)
+        if limiter is not None:
+            return limiter.limit
+        return self.upstream_limits.get(upstream)
+
+    def record(self, upstream: str, latency: float, success: bool):
+        """Repassa o resultado de uma chamada ao limite adaptativo do upstream, se houver."""
+        limiter = self._adaptive.get(upstream)
+        if limiter is None:
+            return
+        previous = limiter.limit
+        limiter.record(latency, success, self._per_upstream.get(upstream, 0))
+        if limiter.limit > previous:
+            self._dispatch()
+
+    def _has_capacity(self, upstream: str) -> bool:
+        if self._in_flight >= self.max_concurrency:
+            return False
+        limit = self.limit_for(upstream)
+        return limit is None or self._per_upstream.get(upstream, 0) < limit
+
+    def _take(self, upstream: str):
+        self._in_flight += 1
+        self._per_upstream[upstream] = self._per_upstream.get(upstream, 0) + 1
+
+    def _release(self, upstream: str):
+        self._in_flight -= 1
+        self._per_upstream[upstream] -= 1
+        self._dispatch()
+
+    def try_take(self, upstream: str) -> bool:
+        """Reserva uma vaga só se houver uma livre agora, sem entrar na fila; devolver com `release`."""
+        if self._waiting() or not self._has_capacity(upstream):
+            return False
+        self._take(upstream)
+        return True
+
+    def release(self, upstream: str):
+        self._release(upstream)
+
+    def _waiting(self) -> int:
+        return sum(len(waiters) for users in self._queues.values() for waiters in users.values())
+
+    def _dispatch(self):
+        # Upstreams com pedido de maior prioridade esperando ficam reservados para ele
+        reserved = set()
+        for priority in PRIORITIES:
+            users = self._queues[priority]
+            progressed = True
+            while progressed and self._in_flight < self.max_concurrency:
+                progressed = False
+                for user in list(users):
+                    waiters = users[user]
+                    # Só o primeiro pedido de cada usuário concorre, preservando a ordem dele
+                    while waiters and waiters[0][1].done():
+                        waiters.popleft()
+                    if not waiters:
+                        del users[user]
+                        continue
+                    upstream, future = waiters[0]
+                    if upstream in reserved or not self._has_capacity(upstream):
+                        continue
+                    waiters.popleft()
+                    self._take(upstream)
+                    future.set_result(None)
+                    # O usuário atendido vai para o fim do rodízio
+                    users.move_to_end(user)
+                    progressed = True
+                    break
+            for waiters in users.values():
+                reserved.update(upstream for upstream, future in waiters if not future.done())
+            if self._in_flight >= self.max_concurrency:
+                return
+
+    @asynccontextmanager
+    async def slot(self, upstream: str, timeout: float = None):
+        """Aguarda vaga para uma requisição ao upstream; `timeout` limita só a espera na fila."""
+        priority = current_priority()
+        start = time.monotonic()
+        if not self._waiting() and self._has_capacity(upstream):
+            self._take(upstream)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._queues[priority].setdefault(_user.get(), deque()).append((upstream, future))
+            self._dispatch()
+            waited = False
+            try:
+                await asyncio.wait({future}, timeout=timeout)
+                waited = True
+            finally:
+                if not future.done():
+                    future.cancel()
+                    self._dispatch()
+                elif not waited and not future.cancelled():
+                    # Vaga concedida no mesmo instante em que o chamador foi cancelado
+                    self._release(upstream)
+            if future.cancelled():
+                raise SchedulerTimeout(f"Sem vaga para o upstream '{upstream}' em {timeout:.2f}s")
+        queue_wait.observe(time.monotonic() - start, upstream=upstream, priority=priority)
+        try:
+            yield
+        finally:
+            self._release(upstream)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self._in_flight,
+            "waiting": {priority: sum(len(w) for w in users.values()) for priority, users in self._queues.items()},
+            "per_upstream": dict(self._per_upstream),
+        }
+
+
+scheduler = FairScheduler()
+
+
+def _collect_scheduler():
+    stats = scheduler.stats()
+    return [
+        snapshot(Gauge, "n2bot_scheduler_waiting", "Requisições aguardando vaga no escalonador.",
+                 {(priority,): count for priority, count in stats["waiting"].items()}, ("priority",)),
+        snapshot(Gauge, "n2bot_scheduler_in_flight", "Requisições com vaga no escalonador, por upstream.",
+                 {(name,): count for name, count in stats["per_upstream"].items()}, ("upstream",)),
+    ]
+
+
+registry.add_collector(_collect_scheduler)
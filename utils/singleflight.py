@@ -0,0 +1,44 @@
+import asyncio
+
+
+class SingleFlight:
+    """Agrupa chamadas concorrentes com a mesma chave em uma única execução compartilhada."""
+
+    def __init__(self):
+        self._inflight = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn, expires_at: float = None, needed_until: float = None):
+        """Executa `fn` ou entra na execução em andamento com a mesma chave.
+
+        `expires_at` é o prazo absoluto (monotônico) de quem lidera; quem chega só entra se esse prazo cobrir
+        `needed_until`, senão inicia a própria execução (um líder quase sem prazo devolveria um timeout).
+        """
+        entry = self._inflight.get(key)
+        if entry is not None:
+            task, leader_expires_at = entry
+            if leader_expires_at is None or (needed_until is not None and leader_expires_at >= needed_until):
+                self.coalesced += 1
+                return await asyncio.shield(task)
+
+        self.leaders += 1
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = (task, expires_at)
+        task.add_done_callback(lambda done: self._forget(key, done))
+        # shield: o cancelamento de um chamador não derruba a requisição dos demais
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is task:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        total = self.leaders + self.coalesced
+        return {
+            "inflight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "dedup_rate": round(self.coalesced / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,46 @@
+import asyncio
+
+
+class TaskGraph:
+    """Grafo de dependências entre chamadas assíncronas.
+
+    Cada nó roda no máximo uma vez, assim que todas as suas dependências terminam;
+    nós independentes rodam em paralelo. Os nós só iniciam quando alguém pede o seu
+    resultado (ou via `start`), então ramos que não forem usados não geram chamadas.
+    """
+
+    def __init__(self):
+        self._nodes = {}
+        self._tasks = {}
+
+    def add(self, name: str, func, *deps: str):
+        self._nodes[name] = (func, deps)
+        return self
+
+    def start(self, *names: str):
+        for name in names:
+            self._task(name)
+
+    def _task(self, name: str) -> asyncio.Future:
+        task = self._tasks.get(name)
+        if task is None:
+            func, deps = self._nodes[name]
+            task = asyncio.ensure_future(self._run(func, deps))
+            self._tasks[name] = task
+        return task
+
+    async def _run(self, func, deps):
+        # shield: um nó cancelado não cancela dependências compartilhadas com outros nós
+        results = await asyncio.gather(*(asyncio.shield(self._task(dep)) for dep in deps))
+        return await func(*results)
+
+    async def result(self, name: str):
+        return await asyncio.shield(self._task(name))
+
+    async def results(self, *names: str) -> list:
+        return await asyncio.gather(*(asyncio.shield(self._task(name)) for name in names))
+
+    def cancel_pending(self):
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
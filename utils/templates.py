@@ -0,0 +1,87 @@
+import re
+import textwrap
+
+TELEGRAM_MAX_LENGTH = 4096
+
+_TAG_RE = re.compile(r"<(/?)([a-zA-Z-]+)([^>]*)>")
+
+
+class Template:
+    """Template de mensagem compilado uma única vez (dedent no carregamento, só `format` por chamada)."""
+
+    def __init__(self, source: str, dedent: bool = True):
+        self.source = textwrap.dedent(source) if dedent else source
+
+    def render(self, **values) -> str:
+        return self.source.format(**values)
+
+
+def telegram_length(text: str) -> int:
+    # O Telegram mede o limite em unidades UTF-16 (emojis contam em dobro)
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _open_tags(text: str, stack: list) -> list:
+    # Caminho rápido: sem tags pendentes e com aberturas e fechamentos em mesmo número
+    if not stack and text.count("<") == 2 * text.count("</"):
+        return stack
+    for closing, name, attrs in _TAG_RE.findall(text):
+        if not closing:
+            stack.append((name, f"<{name}{attrs}>"))
+        elif stack and stack[-1][0] == name:
+            stack.pop()
+    return stack
+
+
+def _split_block(block: str, limit: int) -> list:
+    """Quebra um bloco maior que o limite em linhas e, em último caso, em pedaços de tamanho fixo."""
+    pieces, current = [], ""
+    for line in block.split("\n"):
+        while telegram_length(line) > limit:
+            pieces.append(line[:limit // 2])
+            line = line[limit // 2:]
+        candidate = f"{current}\n{line}" if current else line
+        if current and telegram_length(candidate) > limit:
+            pieces.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_message(text: str, limit: int = TELEGRAM_MAX_LENGTH, separator: str = "\n\n") -> list:
+    """Divide o texto em mensagens de até `limit` caracteres, nas fronteiras de bloco, sem quebrar tags HTML.
+
+    Tags abertas no fim de uma parte são fechadas nela e reabertas no início da parte seguinte.
+    """
+    if telegram_length(text) <= limit:
+        return [text]
+
+    # Reserva espaço para fechar/reabrir tags que atravessem a divisão
+    budget = limit - 64
+    blocks = []
+    for block in text.split(separator):
+        blocks.extend(_split_block(block, budget) if telegram_length(block) > budget else [block])
+
+    parts, current = [], []
+    size = 0
+    for block in blocks:
+        extra = telegram_length(block) + (telegram_length(separator) if current else 0)
+        if current and size + extra > budget:
+            parts.append(separator.join(current))
+            current, size = [], 0
+            extra = telegram_length(block)
+        current.append(block)
+        size += extra
+    if current:
+        parts.append(separator.join(current))
+
+    balanced, stack = [], []
+    for part in parts:
+        prefix = "".join(tag for _, tag in stack)
+        stack = _open_tags(part, stack)
+        suffix = "".join(f"</{name}>" for name, _ in reversed(stack))
+        balanced.append(f"{prefix}{part}{suffix}".strip())
+    return [part for part in balanced if part]
@@ -0,0 +1,86 @@
+import asyncio
+from typing import Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from utils.metrics import Gauge, registry, snapshot
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Processa updates em paralelo até o limite global, mantendo a ordem dentro de cada chat.
+
+    A trava do chat é tomada antes do semáforo global: updates enfileirados atrás de um comando lento
+    do mesmo chat não ocupam vagas, e os demais usuários continuam sendo atendidos. Consultas inline
+    ficam fora da ordenação: cada tecla gera uma, e a busca descarta sozinha as que ficaram obsoletas.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._chat_locks = {}
+        self._chat_waiters = {}
+
+    @staticmethod
+    def _chat_key(update: object):
+        if isinstance(update, Update):
+            if update.inline_query is not None:
+                return None
+            if update.effective_chat is not None:
+                return update.effective_chat.id
+            if update.effective_user is not None:
+                return f"user:{update.effective_user.id}"
+        return None
+
+    async def process_update(self, update: object, coroutine: Awaitable) -> None:
+        key = self._chat_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        # asyncio.Lock atende os waiters em ordem de chegada, preservando a sequência de updates do chat
+        lock = self._chat_locks.get(key)
+        if lock is None:
+            lock = self._chat_locks[key] = asyncio.Lock()
+        self._chat_waiters[key] = self._chat_waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                await super().process_update(update, coroutine)
+        finally:
+            self._chat_waiters[key] -= 1
+            if not self._chat_waiters[key]:
+                del self._chat_waiters[key]
+                del self._chat_locks[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent_updates": self.max_concurrent_updates,
+            "current_concurrent_updates": self.current_concurrent_updates,
+            "active_chats": len(self._chat_locks),
+            "queued_updates": max(0, sum(self._chat_waiters.values()) - self.current_concurrent_updates),
+        }
+
+
+def collector(processor: ChatOrderedUpdateProcessor):
+    def _collect():
+        stats = processor.stats()
+        return [
+            snapshot(Gauge, "n2bot_updates_in_flight", "Updates em processamento.", {(): stats["current_concurrent_updates"]}),
+            snapshot(Gauge, "n2bot_updates_queued", "Updates aguardando a vez do seu chat ou uma vaga global.",
+                     {(): stats["queued_updates"]}),
+        ]
+    return _collect
+
+
+def build_update_processor(max_concurrent_updates: int) -> ChatOrderedUpdateProcessor:
+    processor = ChatOrderedUpdateProcessor(max_concurrent_updates)
+    registry.add_collector(collector(processor))
+    return processor
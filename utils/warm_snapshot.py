@@ -0,0 +1,124 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+
+SNAPSHOT_VERSION = 1
+
+
+class WarmSnapshot:
+    """Grava periodicamente (e no desligamento) os dados quentes do bot num arquivo local e os recarrega na partida.
+
+    Cada seção registra um par `dump()`/`load(data)`; o `load` de cada uma decide o que ainda é válido.
+    """
+
+    def __init__(self):
+        self._sections = {}
+        self._task = None
+        self._lock = asyncio.Lock()
+        self._writing = None
+
+    @property
+    def path(self) -> str:
+        return os.environ.get('N2BOT_SNAPSHOT_PATH', '')
+
+    @property
+    def interval(self) -> float:
+        return float(os.environ.get('N2BOT_SNAPSHOT_INTERVAL', 300))
+
+    @property
+    def max_age(self) -> float:
+        return float(os.environ.get('N2BOT_SNAPSHOT_MAX_AGE', 86400))
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def register(self, name: str, dump, load):
+        self._sections[name] = (dump, load)
+
+    def _write(self, payload: dict):
+        tmp_path = f"{self.path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        # Troca atômica: um desligamento no meio da gravação não corrompe o snapshot anterior
+        os.replace(tmp_path, self.path)
+
+    def _read(self) -> dict:
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    async def save(self) -> bool:
+        if not self.enabled:
+            return False
+        payload = {"version": SNAPSHOT_VERSION, "saved_at": time.time(), "sections": {}}
+        for name, (dump, _) in self._sections.items():
+            try:
+                payload["sections"][name] = dump()
+            except Exception as e:
+                logging.warning(f"Seção '{name}' ignorada no snapshot: {e}")
+        async with self._lock:
+            previous = self._writing
+            if previous is not None and not previous.done():
+                # Quem a iniciou foi cancelado (p.ex. o _save_loop no stop), mas a thread segue gravando o mesmo
+                # arquivo temporário; esperar também impede que o snapshot antigo substitua o novo
+                await asyncio.wait([previous])
+                if previous.exception() is not None:
+                    logging.warning(f"Falha ao gravar snapshot em {self.path}: {previous.exception()}")
+            self._writing = asyncio.get_running_loop().run_in_executor(None, self._write, payload)
+            try:
+                # Sem o shield, cancelar o chamador marcaria a gravação como concluída com a thread ainda rodando
+                await asyncio.shield(self._writing)
+                return True
+            except Exception as e:
+                logging.warning(f"Falha ao gravar snapshot em {self.path}: {e}")
+                return False
+
+    async def restore(self) -> dict:
+        if not self.enabled or not os.path.exists(self.path):
+            return {}
+        try:
+            payload = await asyncio.get_running_loop().run_in_executor(None, self._read)
+        except Exception as e:
+            logging.warning(f"Snapshot em {self.path} ilegível; partindo a frio: {e}")
+            return {}
+        age = time.time() - payload.get("saved_at", 0)
+        if payload.get("version") != SNAPSHOT_VERSION or not 0 <= age <= self.max_age:
+            logging.info(f"Snapshot em {self.path} descartado (versão {payload.get('version')}, idade {age:.0f}s).")
+            return {}
+
+        restored = {}
+        for name, data in payload.get("sections", {}).items():
+            section = self._sections.get(name)
+            if section is None:
+                continue
+            try:
+                restored[name] = section[1](data)
+            except Exception as e:
+                logging.warning(f"Falha ao restaurar a seção '{name}' do snapshot: {e}")
+        logging.info(f"Snapshot restaurado de {self.path} (idade {age:.0f}s): {restored}")
+        return restored
+
+    async def _save_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.save()
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._save_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.save()
+
+
+warm_snapshot = WarmSnapshot()
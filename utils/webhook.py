@@ -0,0 +1,98 @@
+import asyncio
+import hmac
+import logging
+import os
+import secrets
+import signal
+from json import JSONDecodeError
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """Recebe updates do Telegram por webhook (aiohttp) e os entrega à fila da Application."""
+
+    def __init__(self, app: Application):
+        self.app = app
+        self.listen = os.environ.get('N2BOT_WEBHOOK_LISTEN', '0.0.0.0')
+        self.port = int(os.environ.get('N2BOT_WEBHOOK_PORT', 8443))
+        self.path = "/" + os.environ.get('N2BOT_WEBHOOK_PATH', '/telegram').lstrip("/")
+        self.public_url = os.environ.get('N2BOT_WEBHOOK_URL', '').rstrip("/")
+        self.secret = os.environ.get('N2BOT_WEBHOOK_SECRET', '')
+        self.received = 0
+        self.rejected = 0
+        self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            self.rejected += 1
+            logging.warning(f"Webhook recusado de {request.remote}: token secreto inválido.")
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), self.app.bot)
+        except (JSONDecodeError, TypeError, KeyError, ValueError) as e:
+            self.rejected += 1
+            logging.warning(f"Webhook com corpo inválido: {e}")
+            return web.Response(status=400)
+        self.received += 1
+        # Responde na hora; o processamento segue pela fila da Application
+        await self.app.update_queue.put(update)
+        return web.Response()
+
+    async def start(self):
+        if not self.secret:
+            if not self.public_url:
+                raise ValueError("Modo webhook exige N2BOT_WEBHOOK_SECRET quando o webhook não é registrado pelo bot.")
+            self.secret = secrets.token_urlsafe(32)
+            logging.info("Token secreto do webhook gerado para esta execução.")
+        web_app = web.Application()
+        web_app.router.add_post(self.path, self._handle)
+        self._runner = web.AppRunner(web_app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+        logging.info(f"Webhook escutando em http://{self.listen}:{self.port}{self.path}")
+        if self.public_url:
+            await self.app.bot.set_webhook(
+                url=f"{self.public_url}{self.path}", secret_token=self.secret, allowed_updates=Update.ALL_TYPES
+            )
+            logging.info(f"Webhook registrado no Telegram: {self.public_url}{self.path}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def run_webhook(app: Application, stop_event: asyncio.Event = None) -> None:
+    """Equivalente a `run_polling` para o modo webhook, com o mesmo ciclo de vida (post_init/post_shutdown)."""
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    server = WebhookServer(app)
+    await app.initialize()
+    try:
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+        try:
+            await server.start()
+            await stop_event.wait()
+        finally:
+            await server.stop()
+            await app.stop()
+            if app.post_stop:
+                await app.post_stop(app)
+    finally:
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)